@@ -0,0 +1,96 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import BigInteger, Integer, cast, func, select
+from sqlalchemy.orm import Session
+
+import models
+import partitions
+
+SENSOR_METRICS = ("temperature", "humidity", "soil_moisture", "ph_level")
+WEATHER_METRICS = ("temperature", "humidity", "rainfall", "wind_speed")
+
+FUNCTIONS = {
+    "min": func.min,
+    "max": func.max,
+    "avg": func.avg,
+    "sum": func.sum,
+    "count": func.count,
+}
+
+MAX_BUCKETS = 10000
+
+_BUCKET_PATTERN = re.compile(r"^(\d+)([smhdw])$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+class AggregationError(ValueError):
+    pass
+
+def parse_bucket(bucket: str) -> int:
+    match = _BUCKET_PATTERN.match(bucket)
+    if not match or int(match.group(1)) == 0:
+        raise AggregationError("Bucket must look like 30s, 5m, 1h, 1d or 1w")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+def epoch_bucket(db: Session, column, seconds: int):
+    # Start of the bucket as integer epoch seconds, computed inside the database.
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.floor(func.date_part("epoch", column) / seconds) * seconds, BigInteger)
+    return (cast(func.strftime("%s", column), Integer) // seconds) * seconds
+
+def _from_epoch(value: int) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+
+def _validate(metrics: list[str], functions: list[str], allowed: tuple, bucket_seconds: int, start: datetime, end: datetime):
+    unknown = [metric for metric in metrics if metric not in allowed]
+    if unknown:
+        raise AggregationError(f"Unknown metrics: {', '.join(unknown)}")
+    unknown = [name for name in functions if name not in FUNCTIONS]
+    if unknown:
+        raise AggregationError(f"Unknown aggregate functions: {', '.join(unknown)}")
+    if end <= start:
+        raise AggregationError("end must be after start")
+    if (end - start) / timedelta(seconds=bucket_seconds) > MAX_BUCKETS:
+        raise AggregationError(f"Range spans more than {MAX_BUCKETS} buckets, use a larger bucket")
+
+def _aggregate(db: Session, source, timestamp, group_columns: list, filters: list, metrics: list[str], functions: list[str], bucket: str, start: datetime, end: datetime):
+    bucket_seconds = parse_bucket(bucket)
+    bucket_column = epoch_bucket(db, timestamp, bucket_seconds).label("bucket")
+    values = [
+        FUNCTIONS[name](source.c[metric]).label(f"{metric}_{name}")
+        for metric in metrics
+        for name in functions
+    ]
+    stmt = (
+        select(bucket_column, *group_columns, *values)
+        .where(timestamp >= start, timestamp < end, *filters)
+        .group_by(bucket_column, *group_columns)
+        .order_by(bucket_column, *group_columns)
+    )
+    results = []
+    for row in db.execute(stmt).mappings():
+        item = {"bucket_start": _from_epoch(int(row["bucket"])), "values": {value.name: row[value.name] for value in values}}
+        for column in group_columns:
+            item[column.key] = row[column.key]
+        results.append(item)
+    return results
+
+def aggregate_sensor_data(db: Session, bucket: str, start: datetime, end: datetime, metrics: list[str], functions: list[str], sensor_id: int | None = None, per_sensor: bool = False):
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    _validate(metrics, functions, SENSOR_METRICS, parse_bucket(bucket), start, end)
+    tables = partitions.tables_for_range(db, start, end)
+    if len(tables) == 1:
+        source = tables[0]
+        filters = [source.c.sensor_id == sensor_id] if sensor_id is not None else []
+    else:
+        # Range and sensor filters go inside every branch so each partition uses its own index.
+        source = partitions.union_source(tables, lambda table: [table.c.sensor_id == sensor_id] if sensor_id is not None else [], start, end)
+        filters = []
+    group_columns = [source.c.sensor_id] if per_sensor else []
+    return _aggregate(db, source, source.c.timestamp, group_columns, filters, metrics, functions, bucket, start, end)
+
+def aggregate_weather_data(db: Session, bucket: str, start: datetime, end: datetime, metrics: list[str], functions: list[str]):
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    _validate(metrics, functions, WEATHER_METRICS, parse_bucket(bucket), start, end)
+    table = models.WeatherData.__table__
+    return _aggregate(db, table, table.c.timestamp, [], [], metrics, functions, bucket, start, end)
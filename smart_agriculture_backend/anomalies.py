@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+import numpy as np
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.orm import Session
+
+import config
+import metrics
+import models
+import partitions
+
+METRICS = ("temperature", "humidity", "soil_moisture", "ph_level")
+
+# 1.4826 * MAD estimates the standard deviation of normally distributed data
+_MAD_SCALE = 1.4826
+# A MAD this small relative to the median is float noise on a flat series, not a spread
+_MAD_RELATIVE_FLOOR = 1e-9
+
+def rolling_zscore(values: np.ndarray, window: int, min_periods: int) -> np.ndarray:
+    # z-score of each value against the `window` values before it, from two cumulative sums.
+    # Values are shifted by their first element first to keep the sums well conditioned.
+    shifted = values - values[0] if len(values) else values
+    sums = np.concatenate(([0.0], np.cumsum(shifted)))
+    squares = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    index = np.arange(len(values))
+    low = np.maximum(index - window, 0)
+    count = index - low
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[index] - sums[low]) / count
+        variance = np.maximum((squares[index] - squares[low]) / count - mean * mean, 0.0)
+        z = (shifted - mean) / np.sqrt(variance)
+    z[(count < min_periods) | (variance == 0)] = np.nan
+    return z
+
+def robust_score(values: np.ndarray, baseline: np.ndarray) -> np.ndarray:
+    # Distance from the baseline median in units of its scaled median absolute deviation.
+    if len(baseline) == 0:
+        return np.full(len(values), np.nan)
+    median = np.median(baseline)
+    mad = np.median(np.abs(baseline - median)) * _MAD_SCALE
+    if mad < _MAD_RELATIVE_FLOOR * max(1.0, abs(median)):
+        return np.full(len(values), np.nan)
+    return (values - median) / mad
+
+class _MetricState:
+    def __init__(self):
+        self.tail = np.empty(0)
+        self.baseline = np.empty(0)
+        self.rate_baseline = np.empty(0)
+        self.last_value = None
+        self.last_time = None
+
+class _SensorState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_key = None
+        self.metrics = {metric: _MetricState() for metric in METRICS}
+        self.flags = deque(maxlen=config.ANOMALY_MAX_FLAGS)
+
+# Least recently queried first; a dropped sensor is rebuilt from its history on the next call.
+_states = OrderedDict()
+_states_lock = threading.Lock()
+
+def _state(sensor_id: int) -> _SensorState:
+    with _states_lock:
+        state = _states.get(sensor_id)
+        if state is None:
+            state = _states[sensor_id] = _SensorState()
+            while len(_states) > config.ANOMALY_MAX_SENSORS:
+                _states.popitem(last=False)
+        else:
+            _states.move_to_end(sensor_id)
+        return state
+
+def invalidate(sensor_id: int):
+    # An edited or deleted reading changes scores already handed out; start over next call.
+    with _states_lock:
+        _states.pop(sensor_id, None)
+
+def load_series(db: Session, sensor_id: int, after=None, since: datetime | None = None):
+    # Column arrays for one sensor in (timestamp, data_id) order: int64 ids,
+    # datetime64[us] timestamps and float64 metrics with NaN for missing values.
+    tables = partitions.tables_for_range(db, start=since)
+    parts = []
+    for table in tables:
+        stmt = select(table.c.data_id, table.c.timestamp, *(table.c[metric] for metric in METRICS)).where(table.c.sensor_id == sensor_id)
+        if since is not None:
+            stmt = stmt.where(table.c.timestamp >= since)
+        if after is not None:
+            key = tuple_(table.c.timestamp, table.c.data_id)
+            stmt = stmt.where(key > tuple_(literal(after[0], table.c.timestamp.type), literal(after[1], table.c.data_id.type)))
+        # Plain driver tuples: no Row objects and no per-value result processing, which is most of
+        # the cost on a year of minute data. Timestamps come back as text on SQLite and as
+        # datetimes elsewhere; numpy parses either.
+        result = db.execute(stmt.order_by(table.c.timestamp, table.c.data_id))
+        parts.extend(result.cursor.fetchall())
+        result.close()
+    count = len(parts)
+    series = {
+        "data_id": np.fromiter(map(itemgetter(0), parts), dtype=np.int64, count=count),
+        "timestamp": np.array(list(map(itemgetter(1), parts)), dtype="datetime64[us]"),
+    }
+    for index, metric in enumerate(METRICS, start=2):
+        # None becomes NaN in a float64 array.
+        series[metric] = np.array(list(map(itemgetter(index), parts)), dtype=np.float64)
+    if len(tables) > 1:
+        order = np.lexsort((series["data_id"], series["timestamp"]))
+        series = {name: values[order] for name, values in series.items()}
+    return series
+
+def _score_metric(state: _MetricState, times: np.ndarray, values: np.ndarray):
+    # Scores only the new values. The rolling window continues from the carried-over tail and
+    # the MAD scores compare against the last ANOMALY_BASELINE_SIZE readings before them
+    # (on the very first call, against the loaded history itself).
+    window = config.ANOMALY_WINDOW
+    combined = np.concatenate((state.tail, values))
+    z = rolling_zscore(combined, window, max(2, window // 2))[len(state.tail):]
+
+    baseline = state.baseline if len(state.baseline) else values
+    mad_score = robust_score(values, baseline)
+
+    minutes = times.astype("datetime64[s]").astype(np.int64) / 60.0
+    if state.last_value is not None:
+        previous_values = np.concatenate(([state.last_value], values[:-1]))
+        previous_minutes = np.concatenate(([state.last_time], minutes[:-1]))
+    else:
+        previous_values = np.concatenate(([np.nan], values[:-1]))
+        previous_minutes = np.concatenate(([np.nan], minutes[:-1]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = (values - previous_values) / np.maximum(minutes - previous_minutes, 1 / 60)
+    rate_baseline = state.rate_baseline if len(state.rate_baseline) else rate[~np.isnan(rate)]
+    rate_score = robust_score(rate, rate_baseline)
+
+    size = config.ANOMALY_BASELINE_SIZE
+    state.tail = combined[-window:]
+    state.baseline = np.concatenate((state.baseline, values))[-size:]
+    state.rate_baseline = np.concatenate((state.rate_baseline, rate[~np.isnan(rate)]))[-size:]
+    state.last_value = values[-1]
+    state.last_time = minutes[-1]
+    return z, mad_score, rate, rate_score
+
+def _score(state: _SensorState, series: dict) -> int:
+    flagged = 0
+    for metric in METRICS:
+        values = series[metric]
+        present = ~np.isnan(values)
+        if not present.any():
+            continue
+        times = series["timestamp"][present]
+        data_ids = series["data_id"][present]
+        values = values[present]
+        z, mad_score, rate, rate_score = _score_metric(state.metrics[metric], times, values)
+        with np.errstate(invalid="ignore"):
+            is_z = np.abs(z) > config.ANOMALY_Z_THRESHOLD
+            is_mad = np.abs(mad_score) > config.ANOMALY_MAD_THRESHOLD
+            is_spike = np.abs(rate_score) > config.ANOMALY_RATE_THRESHOLD
+        for position in np.flatnonzero(is_z | is_mad | is_spike):
+            kinds = [kind for kind, hit in (("zscore", is_z), ("mad", is_mad), ("spike", is_spike)) if hit[position]]
+            state.flags.append({
+                "data_id": int(data_ids[position]),
+                "timestamp": times[position].astype(datetime),
+                "metric": metric,
+                "value": float(values[position]),
+                "kinds": kinds,
+                "zscore": None if np.isnan(z[position]) else float(z[position]),
+                "mad_score": None if np.isnan(mad_score[position]) else float(mad_score[position]),
+                "rate_per_minute": None if np.isnan(rate[position]) else float(rate[position]),
+            })
+            flagged += 1
+    return flagged
+
+def detect(db: Session, sensor_id: int, start: datetime | None = None, end: datetime | None = None, metric_names: list[str] | None = None) -> list[dict]:
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    state = _state(sensor_id)
+    with state.lock:
+        since = None
+        if state.last_key is None:
+            since = datetime.utcnow() - timedelta(days=config.ANOMALY_HISTORY_DAYS)
+        series = load_series(db, sensor_id, after=state.last_key, since=since)
+        if len(series["data_id"]):
+            flagged = _score(state, series)
+            state.last_key = (series["timestamp"][-1].astype(datetime), int(series["data_id"][-1]))
+            metrics.inc("anomalies.readings_scored", len(series["data_id"]))
+            metrics.inc("anomalies.flagged", flagged)
+        flags = list(state.flags)
+    return [
+        flag for flag in sorted(flags, key=lambda flag: (flag["timestamp"], flag["data_id"], flag["metric"]))
+        if (start is None or flag["timestamp"] >= start)
+        and (end is None or flag["timestamp"] < end)
+        and (metric_names is None or flag["metric"] in metric_names)
+    ]
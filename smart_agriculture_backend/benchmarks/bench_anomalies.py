@@ -0,0 +1,104 @@
+"""Time to score one sensor's series with anomalies.py.
+
+Builds a synthetic minute-level series (default: one year) with injected spikes
+and stuck values, scores it in one pass, then scores a day of new readings
+incrementally on top of the carried state. The same series is then written to a
+scratch SQLite file to time load_series and a sensor's first detect() call,
+which loads and scores the whole history.
+
+    python benchmarks/bench_anomalies.py --days 365
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import anomalies
+import models
+from database import Base
+
+def synthetic_series(minutes: int, start_id: int = 1, start_minute: int = 0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(start_minute, start_minute + minutes)
+    daily = np.sin(2 * np.pi * t / 1440)
+    series = {
+        "data_id": np.arange(start_id, start_id + minutes, dtype=np.int64),
+        "timestamp": np.datetime64("2024-01-01T00:00", "us") + t.astype("timedelta64[m]"),
+        "temperature": 20 + 8 * daily + rng.normal(0, 0.5, minutes),
+        "humidity": 60 - 15 * daily + rng.normal(0, 1.5, minutes),
+        "soil_moisture": 35 + rng.normal(0, 0.8, minutes),
+        "ph_level": 6.5 + rng.normal(0, 0.05, minutes),
+    }
+    spikes = rng.choice(minutes, size=max(1, minutes // 5000), replace=False)
+    series["temperature"][spikes] += 25
+    series["humidity"][rng.choice(minutes, size=max(1, minutes // 20000), replace=False)] = np.nan
+    return series
+
+def populate(engine, series: dict, end: datetime):
+    # Shifted so the newest reading is `end`, inside detect()'s ANOMALY_HISTORY_DAYS window.
+    offset = np.datetime64(end, "us") - series["timestamp"][-1]
+    timestamps = (series["timestamp"] + offset).astype(datetime)
+    metrics = [[None if np.isnan(value) else float(value) for value in series[metric]] for metric in anomalies.METRICS]
+    with engine.begin() as conn:
+        conn.execute(insert(models.Sensor), [
+            {"sensor_id": 1, "type": models.SensorType.temperature, "location": "Bench Field", "status": models.SensorStatus.active}
+        ])
+        rows = [
+            {"data_id": int(data_id), "sensor_id": 1, "timestamp": timestamp, **dict(zip(anomalies.METRICS, values))}
+            for data_id, timestamp, *values in zip(series["data_id"], timestamps, *metrics)
+        ]
+        for start in range(0, len(rows), 50000):
+            conn.execute(insert(models.SensorData), rows[start:start + 50000])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    minutes = args.days * 1440
+    history = synthetic_series(minutes)
+    update = synthetic_series(1440, start_id=minutes + 1, start_minute=minutes, seed=1)
+
+    full, incremental, flagged = [], [], 0
+    for _ in range(args.repeat):
+        state = anomalies._SensorState()
+        started = time.perf_counter()
+        flagged = anomalies._score(state, history)
+        full.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        anomalies._score(state, update)
+        incremental.append(time.perf_counter() - started)
+
+    print(f"{minutes} readings x {len(anomalies.METRICS)} metrics, {flagged} flagged")
+    print(f"full pass:        best {min(full) * 1000:8.1f} ms  median {np.median(full) * 1000:8.1f} ms")
+    print(f"+1 day increment: best {min(incremental) * 1000:8.1f} ms  median {np.median(incremental) * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = create_engine(f"sqlite:///{os.path.join(scratch, 'bench.db')}")
+        Base.metadata.create_all(engine, tables=[models.Sensor.__table__, models.SensorData.__table__])
+        populate(engine, history, datetime.utcnow() - timedelta(minutes=1))
+        loads, firsts = [], []
+        with sessionmaker(bind=engine)() as db:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                anomalies.load_series(db, 1)
+                loads.append(time.perf_counter() - started)
+                anomalies.invalidate(1)
+                started = time.perf_counter()
+                anomalies.detect(db, 1)
+                firsts.append(time.perf_counter() - started)
+    print(f"load_series:      best {min(loads) * 1000:8.1f} ms  median {np.median(loads) * 1000:8.1f} ms")
+    print(f"first detect():   best {min(firsts) * 1000:8.1f} ms  median {np.median(firsts) * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
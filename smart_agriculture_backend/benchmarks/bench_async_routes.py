@@ -0,0 +1,134 @@
+"""Latency versus concurrency for the sensor-data routes, sync handlers versus ASYNC_DB.
+
+Starts the app under uvicorn twice against the same pre-populated scratch
+SQLite file: once with the default sync routes (a threadpool worker held per
+request) and once with ASYNC_DB=true (async handlers on the aiosqlite engine).
+At each concurrency level, that many clients loop for a fixed time over a mix
+of GET /sensor-data/by-sensor/{id} and POST /sensor-data/. Reports requests per
+second, p50/p99 latency and non-2xx responses per level.
+
+    python benchmarks/bench_async_routes.py --concurrency 1 8 32 128 256 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from sqlalchemy import insert
+
+import database
+import models
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def populate(url: str, rows: int, sensors: int):
+    engine = database.make_engine(url, database.sqlite_pragmas())
+    models.Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Sensor), [
+            {"sensor_id": i, "type": models.SensorType.temperature, "location": "Bench Field", "status": models.SensorStatus.active}
+            for i in range(1, sensors + 1)
+        ])
+        conn.execute(insert(models.SensorData), [
+            {
+                "sensor_id": random.randint(1, sensors),
+                "temperature": random.uniform(-5, 40),
+                "humidity": random.uniform(10, 90),
+                "timestamp": now - timedelta(seconds=random.randint(0, 30 * 86400)),
+            }
+            for _ in range(rows)
+        ])
+    engine.dispose()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(url: str, async_db: bool, port: int) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=url, ASYNC_DB="true" if async_db else "false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not come up")
+
+async def client(http: httpx.AsyncClient, args, deadline: float, latencies: list, failures: list):
+    now = datetime.utcnow()
+    while time.perf_counter() < deadline:
+        sensor_id = random.randint(1, args.sensors)
+        began = time.perf_counter()
+        try:
+            if random.random() < args.write_ratio:
+                response = await http.post("/sensor-data/", json={"sensor_id": sensor_id, "temperature": random.uniform(0, 40)})
+            else:
+                start = now - timedelta(days=random.randint(1, 30))
+                response = await http.get(f"/sensor-data/by-sensor/{sensor_id}", params={"start": start.isoformat(), "end": (start + timedelta(days=1)).isoformat()})
+        except httpx.TransportError:
+            failures.append(None)
+            continue
+        latencies.append(time.perf_counter() - began)
+        if response.status_code >= 300:
+            failures.append(response.status_code)
+
+async def drive(port: int, concurrency: int, args):
+    latencies, failures = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as http:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(*(client(http, args, deadline, latencies, failures) for _ in range(concurrency)))
+    return sorted(latencies), len(failures)
+
+def run(label: str, async_db: bool, url: str, args):
+    port = free_port()
+    server = start_server(url, async_db, port)
+    try:
+        for concurrency in args.concurrency:
+            latencies, failures = asyncio.run(drive(port, concurrency, args))
+            if not latencies:
+                print(f"{label:>6} {concurrency:>6} {0:>9.0f} {'-':>9} {'-':>9} {failures:>7}")
+                continue
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"{label:>6} {concurrency:>6} {len(latencies) / args.seconds:>9.0f} {p50:>9.2f} {p99:>9.2f} {failures:>7}")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128, 256])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--sensors", type=int, default=100)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--dir", help="directory for the scratch database (default: system temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as scratch:
+        url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        populate(url, args.rows, args.sensors)
+        print(f"{'mode':>6} {'conc':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'non-2xx':>7}")
+        run("sync", False, url, args)
+        run("async", True, url, args)
+
+if __name__ == "__main__":
+    main()
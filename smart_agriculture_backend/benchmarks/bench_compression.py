@@ -0,0 +1,144 @@
+"""CPU cost versus bytes saved for response compression on typical payloads.
+
+Starts the app under uvicorn on a scratch SQLite file seeded with readings and
+sensors, fetches a few typical bodies uncompressed (sensor-data pages of 1k and
+10k rows, the sensor list, npz and arrow exports), then feeds each one through
+the middleware's own encoders in 64 KiB chunks, as a streamed response would
+arrive, for every installed encoding and each level given. Reports compressed
+size, ratio, CPU milliseconds and throughput per payload.
+
+    python benchmarks/bench_compression.py --gzip-levels 1 6 9 --brotli-qualities 1 4 --zstd-levels 1 3
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from sqlalchemy import insert
+
+import compression
+import config
+import database
+import models
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CHUNK = 64 * 1024
+
+PAYLOADS = {
+    "sensor-data 1k": ("/sensor-data/", {"limit": 1000}),
+    "sensor-data 10k": ("/sensor-data/", {"limit": 10000}),
+    "sensors": ("/sensors/", {"limit": 1000}),
+    "export npz": ("/sensor-data/export", {"format": "npz"}),
+    "export arrow": ("/sensor-data/export", {"format": "arrow"}),
+}
+
+LEVEL_SETTINGS = {"gzip": "COMPRESSION_GZIP_LEVEL", "br": "COMPRESSION_BROTLI_QUALITY", "zstd": "COMPRESSION_ZSTD_LEVEL"}
+
+def populate(url: str, rows: int, sensors: int):
+    engine = database.make_engine(url, database.sqlite_pragmas())
+    models.Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Sensor), [
+            {"sensor_id": i, "type": random.choice(list(models.SensorType)), "location": random.choice(["North Field", "South Field", "East Orchard"]), "status": models.SensorStatus.active}
+            for i in range(1, sensors + 1)
+        ])
+        conn.execute(insert(models.SensorData), [
+            {
+                "sensor_id": random.randint(1, sensors),
+                "temperature": round(random.uniform(-5, 40), 2),
+                "humidity": round(random.uniform(10, 90), 1),
+                "soil_moisture": random.choice([None, round(random.uniform(0, 60), 1)]),
+                "timestamp": now - timedelta(seconds=random.randint(0, 25 * 86400)),
+            }
+            for _ in range(rows)
+        ])
+    engine.dispose()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(url: str, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=dict(os.environ, DATABASE_URL=url),
+    )
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not come up")
+
+def fetch_payloads(url: str) -> dict:
+    port = free_port()
+    server = start_server(url, port)
+    bodies = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", headers={"Accept-Encoding": "identity"}, timeout=300) as http:
+            for label, (path, params) in PAYLOADS.items():
+                response = http.get(path, params=params)
+                if response.status_code == 200:
+                    bodies[label] = response.content
+                else:
+                    print(f"skipping {label}: HTTP {response.status_code}")
+    finally:
+        server.terminate()
+        server.wait()
+    return bodies
+
+def compress(encoder, body: bytes) -> tuple[int, float]:
+    began = time.process_time()
+    compressor = encoder()
+    size = 0
+    for offset in range(0, len(body), CHUNK):
+        size += len(compressor.compress(body[offset:offset + CHUNK]))
+    size += len(compressor.finish())
+    return size, time.process_time() - began
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--sensors", type=int, default=500)
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--brotli-qualities", type=int, nargs="+", default=[1, 4, 9])
+    parser.add_argument("--zstd-levels", type=int, nargs="+", default=[1, 3, 9])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    levels = {"gzip": args.gzip_levels, "br": args.brotli_qualities, "zstd": args.zstd_levels}
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        populate(url, args.rows, args.sensors)
+        bodies = fetch_payloads(url)
+
+    encoders = compression.available()
+    missing = sorted(set(LEVEL_SETTINGS) - set(encoders))
+    if missing:
+        print(f"not installed: {', '.join(missing)}")
+    print(f"{'payload':<16} {'KB':>8} {'enc':>5} {'level':>5} {'out KB':>8} {'ratio':>6} {'cpu ms':>8} {'MB/s':>7}")
+    for label, body in bodies.items():
+        for name, encoder in encoders.items():
+            for level in levels[name]:
+                setattr(config, LEVEL_SETTINGS[name], level)
+                size, seconds = min((compress(encoder, body) for _ in range(args.repeat)), key=lambda result: result[1])
+                print(
+                    f"{label:<16} {len(body) / 1024:>8.0f} {name:>5} {level:>5} {size / 1024:>8.0f} "
+                    f"{len(body) / size:>6.1f} {seconds * 1000:>8.1f} {len(body) / 1e6 / seconds if seconds else float('inf'):>7.0f}"
+                )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""GET /sensor-data/ page latency at 1k/10k/100k rows, standard encoder versus FAST_JSON_LISTS.
+
+Starts the app under uvicorn twice against the same pre-populated scratch
+SQLite file: once with the default response_model serialisation and once with
+FAST_JSON_LISTS=true (row tuples encoded by orjson and streamed). Fetches each
+page size --repeat times per mode, checks that both modes return byte-identical
+bodies and reports median and best latency plus the share of the default time saved.
+
+    python benchmarks/bench_json_lists.py --limits 1000 10000 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from sqlalchemy import insert
+
+import database
+import models
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def populate(url: str, rows: int, sensors: int):
+    engine = database.make_engine(url, database.sqlite_pragmas())
+    models.Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Sensor), [
+            {"sensor_id": i, "type": models.SensorType.temperature, "location": "Bench Field", "status": models.SensorStatus.active}
+            for i in range(1, sensors + 1)
+        ])
+        conn.execute(insert(models.SensorData), [
+            {
+                "sensor_id": random.randint(1, sensors),
+                "temperature": random.uniform(-5, 40),
+                "humidity": random.uniform(10, 90),
+                "soil_moisture": random.choice([None, random.uniform(0, 60)]),
+                "timestamp": now - timedelta(seconds=random.randint(0, 25 * 86400), microseconds=random.randint(0, 999999)),
+            }
+            for _ in range(rows)
+        ])
+    engine.dispose()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(url: str, fast_json: bool, port: int) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=url, FAST_JSON_LISTS="true" if fast_json else "false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not come up")
+
+def run(fast_json: bool, url: str, args) -> dict:
+    # Returns {limit: (timings, body)} for one mode.
+    port = free_port()
+    server = start_server(url, fast_json, port)
+    results = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300) as http:
+            for limit in args.limits:
+                http.get("/sensor-data/", params={"limit": limit}).raise_for_status()
+                timings = []
+                for _ in range(args.repeat):
+                    began = time.perf_counter()
+                    response = http.get("/sensor-data/", params={"limit": limit})
+                    response.raise_for_status()
+                    timings.append(time.perf_counter() - began)
+                results[limit] = (timings, response.content)
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limits", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rows", type=int, help="readings to seed (default: the largest limit)")
+    parser.add_argument("--sensors", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        populate(url, args.rows or max(args.limits), args.sensors)
+        standard = run(False, url, args)
+        fast = run(True, url, args)
+        print(f"{'rows':>7} {'MB':>7} {'std p50':>9} {'std min':>9} {'fast p50':>9} {'fast min':>9} {'saved':>6} identical")
+        for limit in args.limits:
+            (std_times, std_body), (fast_times, fast_body) = standard[limit], fast[limit]
+            std_p50, fast_p50 = statistics.median(std_times) * 1000, statistics.median(fast_times) * 1000
+            print(
+                f"{limit:>7} {len(std_body) / 1e6:>7.2f} {std_p50:>9.1f} {min(std_times) * 1000:>9.1f} "
+                f"{fast_p50:>9.1f} {min(fast_times) * 1000:>9.1f} {1 - fast_p50 / std_p50:>6.0%} {std_body == fast_body}"
+            )
+
+if __name__ == "__main__":
+    main()
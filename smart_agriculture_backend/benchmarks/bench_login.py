@@ -0,0 +1,132 @@
+"""Login throughput, and what it does to the other routes, under concurrent POST /login.
+
+Starts the app under uvicorn on a scratch SQLite file seeded with users that
+share one bcrypt hash of --rounds cost. At each concurrency level, that many
+clients log in as random users for a fixed time while one extra client keeps
+polling GET /sensors/ to show whether ordinary requests still get through.
+Reports logins per second, login p50/p99, 503s from the password pool queue
+limit and the p99 of the polling route.
+
+    python benchmarks/bench_login.py --concurrency 1 8 32 128 --rounds 12 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from passlib.context import CryptContext
+from sqlalchemy import insert
+
+import database
+import models
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PASSWORD = "bench-password"
+
+def populate(url: str, users: int, rounds: int):
+    engine = database.make_engine(url, database.sqlite_pragmas())
+    models.Base.metadata.create_all(engine)
+    hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"name": "Bench User", "email": f"user{i}@example.com", "hashed_password": hashed_password, "role": models.UserRole.farmer}
+            for i in range(users)
+        ])
+        conn.execute(insert(models.Sensor), [
+            {"type": models.SensorType.temperature, "location": "Bench Field", "status": models.SensorStatus.active}
+            for _ in range(100)
+        ])
+    engine.dispose()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(url: str, args, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ, DATABASE_URL=url, BCRYPT_ROUNDS=str(args.rounds),
+        PASSWORD_WORKERS=str(args.workers), PASSWORD_QUEUE_LIMIT=str(args.queue_limit),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not come up")
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000 if ordered else float("nan")
+
+async def login_client(http: httpx.AsyncClient, users: int, deadline: float, latencies: list, rejected: list):
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        response = await http.post("/login", data={"username": f"user{random.randrange(users)}@example.com", "password": PASSWORD})
+        if response.status_code == 503:
+            rejected.append(None)
+            continue
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - began)
+
+async def poll_client(http: httpx.AsyncClient, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        (await http.get("/sensors/")).raise_for_status()
+        latencies.append(time.perf_counter() - began)
+        await asyncio.sleep(0.01)
+
+async def drive(port: int, concurrency: int, args):
+    logins, rejected, polls = [], [], []
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as http:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            poll_client(http, deadline, polls),
+            *(login_client(http, args.users, deadline, logins, rejected) for _ in range(concurrency)),
+        )
+    return sorted(logins), len(rejected), sorted(polls)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queue-limit", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        populate(url, args.users, args.rounds)
+        port = free_port()
+        server = start_server(url, args, port)
+        try:
+            print(f"{'conc':>6} {'logins/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'503s':>6} {'poll p99':>9}")
+            for concurrency in args.concurrency:
+                logins, rejected, polls = asyncio.run(drive(port, concurrency, args))
+                print(
+                    f"{concurrency:>6} {len(logins) / args.seconds:>9.1f} {percentile(logins, 0.5):>9.1f} "
+                    f"{percentile(logins, 0.99):>9.1f} {rejected:>6} {percentile(polls, 0.99):>9.1f}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Latency of GET /sensor-data/by-sensor/{id}?start=&end= as sensor_data grows.
+
+Runs crud.get_sensor_data_by_sensor for a one-day window against a scratch
+SQLite file, with and without the (sensor_id, timestamp) index.
+
+    python benchmarks/bench_sensor_data_range.py --sizes 10000 100000 1000000 10000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+
+INDEX_NAME = "ix_sensor_data_sensor_id_timestamp"
+EPOCH = datetime(2024, 1, 1)
+
+def populate(engine, count: int, sensors: int, span_days: int):
+    chunk = 50000
+    with engine.begin() as conn:
+        for offset in range(0, count, chunk):
+            rows = [
+                {
+                    "sensor_id": random.randint(1, sensors),
+                    "temperature": random.uniform(-5, 40),
+                    "humidity": random.uniform(10, 90),
+                    "soil_moisture": random.uniform(0, 60),
+                    "ph_level": random.uniform(5, 8),
+                    "timestamp": EPOCH + timedelta(seconds=random.randint(0, span_days * 86400)),
+                }
+                for _ in range(min(chunk, count - offset))
+            ]
+            conn.execute(insert(models.SensorData), rows)
+
+def measure(Session, sensors: int, span_days: int, queries: int):
+    timings = []
+    with Session() as db:
+        for _ in range(queries):
+            sensor_id = random.randint(1, sensors)
+            start = EPOCH + timedelta(days=random.randint(0, span_days - 1))
+            began = time.perf_counter()
+            crud.get_sensor_data_by_sensor(db, sensor_id, start=start, end=start + timedelta(days=1), limit=1000)
+            timings.append((time.perf_counter() - began) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--sensors", type=int, default=200)
+    parser.add_argument("--span-days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    print(f"{'rows':>10} {'indexed p50':>12} {'indexed p95':>12} {'scan p50':>10} {'scan p95':>10}  (ms)")
+    loaded = 0
+    for size in sorted(args.sizes):
+        populate(engine, size - loaded, args.sensors, args.span_days)
+        loaded = size
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        indexed = measure(Session, args.sensors, args.span_days, args.queries)
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX {INDEX_NAME}"))
+        scan = measure(Session, args.sensors, args.span_days, max(5, args.queries // 20))
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX {INDEX_NAME} ON sensor_data (sensor_id, timestamp)"))
+        print(f"{size:>10} {indexed[0]:>12.3f} {indexed[1]:>12.3f} {scan[0]:>10.3f} {scan[1]:>10.3f}")
+
+    os.remove(path)
+
+if __name__ == "__main__":
+    main()
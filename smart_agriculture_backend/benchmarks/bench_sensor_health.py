@@ -0,0 +1,66 @@
+"""Duration of one health.evaluate() pass as the number of sensors grows.
+
+Fills a scratch SQLite file with sensors and their sensor_health summaries
+(a mix of healthy, silent, flatlined and at-limit sensors), then times a
+pass that faults them and a second pass after they all recover.
+
+    python benchmarks/bench_sensor_health.py --sensors 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+
+import health
+import models
+from database import Base
+
+def populate(engine, sensors: int, now: datetime):
+    with engine.begin() as conn:
+        conn.execute(insert(models.Sensor), [
+            {"sensor_id": i, "type": models.SensorType.temperature, "location": "Bench Field", "status": models.SensorStatus.active}
+            for i in range(1, sensors + 1)
+        ])
+        rows = []
+        for i in range(1, sensors + 1):
+            kind = random.random()
+            last = now - timedelta(hours=3) if kind < 0.05 else now - timedelta(seconds=30)
+            flat_since = now - timedelta(days=1) if 0.05 <= kind < 0.1 else last
+            at_limit_since = now - timedelta(hours=1) if 0.1 <= kind < 0.15 else None
+            rows.append({
+                "sensor_id": i, "last_data_id": i, "last_reading_at": last, "temperature": 20.0,
+                "flat_since": flat_since, "flat_count": 500 if flat_since < last else 1,
+                "at_limit_since": at_limit_since, "at_limit_count": 50 if at_limit_since else 0,
+            })
+        conn.execute(insert(models.SensorHealth), rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sensors", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = create_engine(f"sqlite:///{os.path.join(scratch, 'bench.db')}")
+        Base.metadata.create_all(engine, tables=[models.Sensor.__table__, models.SensorHealth.__table__])
+        now = datetime.utcnow()
+        populate(engine, args.sensors, now)
+        with sessionmaker(bind=engine)() as db:
+            started = time.perf_counter()
+            result = health.evaluate(db, now)
+            print(f"{args.sensors} sensors, fault pass:    {(time.perf_counter() - started) * 1000:8.1f} ms  {result}")
+            db.execute(update(models.SensorHealth).values(last_reading_at=now, flat_since=now, flat_count=1, at_limit_since=None, at_limit_count=0))
+            db.commit()
+            started = time.perf_counter()
+            result = health.evaluate(db, now)
+            print(f"{args.sensors} sensors, recovery pass: {(time.perf_counter() - started) * 1000:8.1f} ms  {result}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Mixed read/write throughput on SQLite with and without the connection pragmas.
+
+Runs reader threads (crud.get_sensor_data_by_sensor over a one-day window) and
+writer threads (crud.create_sensor_data) against a scratch file for a fixed
+time. The run is done twice: once with SQLite defaults (rollback journal,
+synchronous=FULL) and once with the pragmas from database.sqlite_pragmas().
+Reports operations per second, latency and "database is locked" errors.
+
+    python benchmarks/bench_sqlite_pragmas.py --readers 8 --writers 4 --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import database
+import models
+import schemas
+
+def populate(engine, rows: int, sensors: int):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Sensor), [
+            {"sensor_id": i, "type": models.SensorType.temperature, "location": "Bench Field", "status": models.SensorStatus.active}
+            for i in range(1, sensors + 1)
+        ])
+        conn.execute(insert(models.SensorData), [
+            {
+                "sensor_id": random.randint(1, sensors),
+                "temperature": random.uniform(-5, 40),
+                "humidity": random.uniform(10, 90),
+                "timestamp": now - timedelta(seconds=random.randint(0, 30 * 86400)),
+            }
+            for _ in range(rows)
+        ])
+
+def worker(Session, kind: str, sensors: int, deadline: float, results: dict, lock: threading.Lock):
+    latencies, errors = [], 0
+    now = datetime.utcnow()
+    with Session() as db:
+        while time.perf_counter() < deadline:
+            sensor_id = random.randint(1, sensors)
+            began = time.perf_counter()
+            try:
+                if kind == "write":
+                    crud.create_sensor_data(db, schemas.SensorDataCreate(sensor_id=sensor_id, temperature=random.uniform(0, 40)))
+                else:
+                    start = now - timedelta(days=random.randint(1, 30))
+                    crud.get_sensor_data_by_sensor(db, sensor_id, start=start, end=start + timedelta(days=1))
+                    db.rollback()
+            except OperationalError:
+                db.rollback()
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - began)
+    with lock:
+        results[kind]["latencies"].extend(latencies)
+        results[kind]["errors"] += errors
+
+def run(label: str, pragmas: dict | None, args):
+    # fsync cost is what synchronous=NORMAL saves, so point --dir at the real data disk, not tmpfs
+    with tempfile.TemporaryDirectory(dir=args.dir) as scratch:
+        engine = database.make_engine(f"sqlite:///{os.path.join(scratch, 'bench.db')}", pragmas)
+        models.Base.metadata.create_all(engine)
+        populate(engine, args.rows, args.sensors)
+        Session = sessionmaker(bind=engine)
+        results = {kind: {"latencies": [], "errors": 0} for kind in ("read", "write")}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(target=worker, args=(Session, kind, args.sensors, deadline, results, lock))
+            for kind, count in (("read", args.readers), ("write", args.writers))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    for kind, result in results.items():
+        latencies = sorted(result["latencies"])
+        if not latencies:
+            print(f"{label:>9} {kind:>6} {0:>9.0f} {'-':>9} {'-':>9} {result['errors']:>7}")
+            continue
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(f"{label:>9} {kind:>6} {len(latencies) / args.seconds:>9.0f} {p50:>9.2f} {p99:>9.2f} {result['errors']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--sensors", type=int, default=100)
+    parser.add_argument("--dir", help="directory for the scratch database (default: system temp dir)")
+    args = parser.parse_args()
+
+    print(f"{'settings':>9} {'op':>6} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'locked':>7}")
+    run("defaults", None, args)
+    run("pragmas", database.sqlite_pragmas(), args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import zlib
+
+import config
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies that are already compressed, or must reach the client frame by frame, go out as they are.
+# application/octet-stream is the npz export, whose arrays are deflated inside the archive.
+SKIP_MEDIA_TYPES = ("text/event-stream", "application/vnd.apache.parquet", "application/octet-stream", "application/zip", "application/gzip")
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(config.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=config.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _Zstd:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=config.COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def available() -> dict:
+    encoders = {"gzip": _Gzip}
+    if brotli is not None:
+        encoders["br"] = _Brotli
+    if zstandard is not None:
+        encoders["zstd"] = _Zstd
+    return encoders
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=") if params.strip().startswith("q=") else "1"
+        try:
+            if float(quality) > 0:
+                accepted.add(name.strip().lower())
+        except ValueError:
+            pass
+    return accepted
+
+class CompressionMiddleware:
+    # Compresses response bodies chunk by chunk as the app sends them, so a streamed export
+    # or list page never sits in memory whole. The encoding is the first of
+    # COMPRESSION_ENCODINGS that is installed and that the client accepts.
+    def __init__(self, app):
+        self.app = app
+        encoders = available()
+        self.encoders = [(name, encoders[name]) for name in config.COMPRESSION_ENCODINGS if name in encoders]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encoders:
+            return await self.app(scope, receive, send)
+        accept = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value
+        accepted = accepted_encodings(accept.decode("latin-1"))
+        chosen = next(((name, encoder) for name, encoder in self.encoders if name in accepted), None)
+        if chosen is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSend(send, *chosen))
+
+class _CompressingSend:
+    # Holds http.response.start until the first body chunk shows whether compressing is worthwhile.
+    def __init__(self, send, encoding: str, encoder):
+        self.send = send
+        self.encoding = encoding
+        self.encoder = encoder
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            return await self.send(message)
+        if message["type"] == "http.response.start":
+            self.start = message
+            if self._skip(message):
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body":
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < config.COMPRESSION_MIN_SIZE:
+                self.passthrough = True
+                await self.send(self.start)
+                return await self.send(message)
+            self.compressor = self.encoder()
+            await self.send(self._compressed_start())
+        compressed = self.compressor.compress(body)
+        if not more_body:
+            compressed += self.compressor.finish()
+        metrics.inc(f"compression.{self.encoding}.bytes_in", len(body))
+        metrics.inc(f"compression.{self.encoding}.bytes_out", len(compressed))
+        if compressed or not more_body:
+            await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _skip(self, start) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return True
+        for name, value in start["headers"]:
+            if name == b"content-encoding":
+                return True
+            if name == b"content-type" and value.decode("latin-1").split(";")[0].strip().lower() in SKIP_MEDIA_TYPES:
+                return True
+            if name == b"content-length" and int(value) < config.COMPRESSION_MIN_SIZE:
+                return True
+        return False
+
+    def _compressed_start(self):
+        headers = []
+        vary = None
+        for name, value in self.start["headers"]:
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # The compressed bytes are a different representation; If-None-Match compares weakly
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        return {**self.start, "headers": headers}
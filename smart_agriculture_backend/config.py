@@ -0,0 +1,141 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+# ----- DATABASE -----
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./smart_agriculture.db")
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT_S = _env_int("DB_POOL_TIMEOUT_S", 30)
+# Seconds after which a pooled connection is replaced; -1 keeps connections forever
+DB_POOL_RECYCLE_S = _env_int("DB_POOL_RECYCLE_S", 1800)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# Comma-separated engines that serve GET/HEAD routes (replicas); writes always use DATABASE_URL
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+# With no DATABASE_READ_URLS, open a SQLite DATABASE_URL a second time read-only for reads.
+# Only useful in WAL mode, where readers run beside the writer instead of waiting on it.
+SQLITE_READ_ENGINE = _env_bool("SQLITE_READ_ENGINE", False)
+
+# Serve the hot routes (sensor-data ingest and reads, login) from async handlers on an async engine
+ASYNC_DB = _env_bool("ASYNC_DB", False)
+# Defaults to DATABASE_URL with its asyncio driver (sqlite+aiosqlite, postgresql+asyncpg)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# Applied to every new SQLite connection; set SQLITE_PRAGMAS=false to run with SQLite defaults
+SQLITE_PRAGMAS = _env_bool("SQLITE_PRAGMAS", True)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+# Negative values are KiB, as in PRAGMA cache_size
+SQLITE_CACHE_SIZE = _env_int("SQLITE_CACHE_SIZE", -64 * 1024)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+# ----- SENSOR DATA INGEST -----
+
+# "direct" commits every reading in the request, "write_behind" hands it to the group-commit queue
+SENSOR_DATA_INGEST_MODE = os.getenv("SENSOR_DATA_INGEST_MODE", "direct")
+WRITE_BEHIND_MAX_DEPTH = _env_int("WRITE_BEHIND_MAX_DEPTH", 10000)
+WRITE_BEHIND_FLUSH_ROWS = _env_int("WRITE_BEHIND_FLUSH_ROWS", 500)
+WRITE_BEHIND_FLUSH_INTERVAL_MS = _env_int("WRITE_BEHIND_FLUSH_INTERVAL_MS", 50)
+# "commit" acknowledges after the batch is committed, "enqueue" as soon as the reading is queued
+WRITE_BEHIND_DURABILITY = os.getenv("WRITE_BEHIND_DURABILITY", "commit")
+WRITE_BEHIND_ACK_TIMEOUT_S = _env_int("WRITE_BEHIND_ACK_TIMEOUT_S", 30)
+
+# ----- RETENTION -----
+
+RETENTION_ENABLED = _env_bool("RETENTION_ENABLED", False)
+RETENTION_RAW_DAYS = _env_int("RETENTION_RAW_DAYS", 90)
+# "downsample" keeps only the rollups for expired readings, "archive" also writes them to ARCHIVE_DIR.
+# Rollups of purged days cannot be rebuilt; rollups.py backfill only rebuilds from the oldest raw reading on.
+RETENTION_MODE = os.getenv("RETENTION_MODE", "downsample")
+RETENTION_BATCH_SIZE = _env_int("RETENTION_BATCH_SIZE", 5000)
+RETENTION_INTERVAL_S = _env_int("RETENTION_INTERVAL_S", 3600)
+RETENTION_VACUUM_PAGES = _env_int("RETENTION_VACUUM_PAGES", 2000)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+# Unset means parquet when pyarrow is installed, npz otherwise
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT")
+
+# ----- PARTITIONING -----
+
+# "monthly" moves readings from past months out of sensor_data into sensor_data_YYYYMM tables.
+# Reads only look past sensor_data while it is "monthly": months sealed earlier stay unread if it is switched off.
+SENSOR_DATA_PARTITIONING = os.getenv("SENSOR_DATA_PARTITIONING", "none")
+PARTITION_SEAL_INTERVAL_S = _env_int("PARTITION_SEAL_INTERVAL_S", 3600)
+PARTITION_SEAL_BATCH_SIZE = _env_int("PARTITION_SEAL_BATCH_SIZE", 5000)
+
+# ----- LIVE STREAM -----
+
+# Frames buffered per /sensor-data/stream client before it is considered too slow and dropped
+LIVE_QUEUE_SIZE = _env_int("LIVE_QUEUE_SIZE", 256)
+LIVE_MAX_SUBSCRIBERS = _env_int("LIVE_MAX_SUBSCRIBERS", 10000)
+LIVE_HEARTBEAT_S = _env_int("LIVE_HEARTBEAT_S", 15)
+
+# ----- ANOMALY DETECTION -----
+
+ANOMALY_WINDOW = _env_int("ANOMALY_WINDOW", 60)
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", 4.0))
+ANOMALY_MAD_THRESHOLD = float(os.getenv("ANOMALY_MAD_THRESHOLD", 5.0))
+ANOMALY_RATE_THRESHOLD = float(os.getenv("ANOMALY_RATE_THRESHOLD", 8.0))
+ANOMALY_BASELINE_SIZE = _env_int("ANOMALY_BASELINE_SIZE", 10080)
+# How far back the first call for a sensor looks; later calls only score newer readings
+ANOMALY_HISTORY_DAYS = _env_int("ANOMALY_HISTORY_DAYS", 365)
+ANOMALY_MAX_FLAGS = _env_int("ANOMALY_MAX_FLAGS", 10000)
+# Sensors whose scoring state is kept in memory; the least recently queried is dropped first
+ANOMALY_MAX_SENSORS = _env_int("ANOMALY_MAX_SENSORS", 10000)
+
+# ----- SENSOR HEALTH -----
+
+HEALTH_ENABLED = _env_bool("HEALTH_ENABLED", False)
+HEALTH_INTERVAL_S = _env_int("HEALTH_INTERVAL_S", 60)
+# A sensor is faulty after this long without a reading ...
+HEALTH_SILENT_AFTER_S = _env_int("HEALTH_SILENT_AFTER_S", 3600)
+# ... or after reporting identical values for this long (and at least HEALTH_MIN_RUN readings) ...
+HEALTH_FLATLINE_AFTER_S = _env_int("HEALTH_FLATLINE_AFTER_S", 6 * 3600)
+# ... or after reporting a value at a physical limit for this long
+HEALTH_AT_LIMIT_AFTER_S = _env_int("HEALTH_AT_LIMIT_AFTER_S", 1800)
+HEALTH_MIN_RUN = _env_int("HEALTH_MIN_RUN", 3)
+
+# ----- MIGRATIONS -----
+
+# Rows per committed batch; each batch also commits the step's resume checkpoint
+MIGRATION_CHUNK_SIZE = _env_int("MIGRATION_CHUNK_SIZE", 5000)
+MIGRATION_PROGRESS_INTERVAL_S = _env_int("MIGRATION_PROGRESS_INTERVAL_S", 5)
+
+# ----- PASSWORDS -----
+
+# bcrypt cost for new hashes; stored hashes with another cost are rehashed on the next login
+BCRYPT_ROUNDS = _env_int("BCRYPT_ROUNDS", 12)
+# Threads dedicated to hashing and verifying; bcrypt releases the GIL, so one per core scales
+PASSWORD_WORKERS = _env_int("PASSWORD_WORKERS", os.cpu_count() or 1)
+# Hashes allowed to wait for a worker before logins are turned away with 503
+PASSWORD_QUEUE_LIMIT = _env_int("PASSWORD_QUEUE_LIMIT", 64)
+
+# ----- PRINCIPAL CACHE -----
+
+# Authenticated users kept per token subject so get_current_user skips the users table
+PRINCIPAL_CACHE_SIZE = _env_int("PRINCIPAL_CACHE_SIZE", 10000)
+# Upper bound on how long a change made outside this process (another worker, a script) goes unseen
+PRINCIPAL_CACHE_TTL_S = _env_int("PRINCIPAL_CACHE_TTL_S", 300)
+
+# ----- RESPONSES -----
+
+# Serialise sensor-data list pages straight from row tuples with orjson (needs orjson installed)
+FAST_JSON_LISTS = _env_bool("FAST_JSON_LISTS", False)
+
+# Response compression, in order of preference for clients that send Accept-Encoding; br and zstd
+# are skipped unless brotli / zstandard are installed, and an empty list turns compression off
+COMPRESSION_ENCODINGS = [name.strip() for name in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if name.strip()]
+# Bodies smaller than this go out as they are (streamed bodies are always compressed)
+COMPRESSION_MIN_SIZE = _env_int("COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_GZIP_LEVEL = _env_int("COMPRESSION_GZIP_LEVEL", 6)
+COMPRESSION_BROTLI_QUALITY = _env_int("COMPRESSION_BROTLI_QUALITY", 4)
+COMPRESSION_ZSTD_LEVEL = _env_int("COMPRESSION_ZSTD_LEVEL", 3)
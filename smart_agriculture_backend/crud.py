@@ -1,265 +1,294 @@
+from datetime import datetime
+from sqlalchemy import bindparam, delete, func, insert, select, update
 from sqlalchemy.orm import Session
+import config
 import models
 import schemas
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import anomalies
+import health
+import latest_cache
+import live
+import pagination
+import partitions
+import passwords
+import rollups
+import versions  # bumps table versions on commit
+from repository import Repository
+
+users = Repository(models.User, models.User.user_id)
+sensors = Repository(models.Sensor, models.Sensor.sensor_id)
+irrigation_systems = Repository(models.IrrigationSystem, models.IrrigationSystem.irrigation_id)
+weather_data = Repository(models.WeatherData, models.WeatherData.weather_id)
+crops = Repository(models.CropManagement, models.CropManagement.crop_id)
+fertilization_systems = Repository(models.FertilizationSystem, models.FertilizationSystem.fertilization_id)
+pest_disease_detections = Repository(models.PestDiseaseDetection, models.PestDiseaseDetection.detection_id)
+supply_chain_transactions = Repository(models.SupplyChainTransaction, models.SupplyChainTransaction.transaction_id)
+
+_user_by_email = select(models.User).where(models.User.email == bindparam("email"))
 
 def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.user_id == user_id).first()
+    return users.get(db, user_id)
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
-
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
-
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
-    db_user = models.User(
-        name=user.name,
-        email=user.email,
-        hashed_password=hashed_password,
-        role=user.role
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return db.scalars(_user_by_email, {"email": email}).first()
+
+def get_users(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return users.list(db, skip=skip, limit=limit, cursor=cursor)
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str | None = None):
+    if hashed_password is None:
+        hashed_password = passwords.hash_password(user.password)
+    return users.create(db, {"name": user.name, "email": user.email, "hashed_password": hashed_password, "role": user.role})
+
+def update_user(db: Session, user_id: int, user: schemas.UserBase):
+    return users.update(db, user_id, {"name": user.name, "email": user.email, "role": user.role})
+
+def delete_user(db: Session, user_id: int):
+    return users.delete(db, user_id)
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    return users.update(db, user_id, {"hashed_password": hashed_password})
 
 def get_sensor(db: Session, sensor_id: int):
-    return db.query(models.Sensor).filter(models.Sensor.sensor_id == sensor_id).first()
+    return sensors.get(db, sensor_id)
 
-def get_sensors(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Sensor).offset(skip).limit(limit).all()
+def get_sensors(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return sensors.list(db, skip=skip, limit=limit, cursor=cursor)
 
 def create_sensor(db: Session, sensor: schemas.SensorCreate):
-    db_sensor = models.Sensor(**sensor.model_dump())
-    db.add(db_sensor)
-    db.commit()
-    db.refresh(db_sensor)
-    return db_sensor
+    return sensors.create(db, sensor.model_dump())
 
-def get_sensor_data(db: Session, data_id: int):
-    return db.query(models.SensorData).filter(models.SensorData.data_id == data_id).first()
+def update_sensor(db: Session, sensor_id: int, sensor: schemas.SensorCreate):
+    health.clear_fault(db, sensor_id)
+    return sensors.update(db, sensor_id, sensor.model_dump())
 
-def get_all_sensor_data(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.SensorData).offset(skip).limit(limit).all()
+def delete_sensor(db: Session, sensor_id: int):
+    return sensors.delete(db, sensor_id)
 
-def get_sensor_data_by_sensor(db: Session, sensor_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.SensorData).filter(models.SensorData.sensor_id == sensor_id).offset(skip).limit(limit).all()
+def get_sensor_data(db: Session, data_id: int):
+    return partitions.locate(db, data_id)[1]
+
+def get_all_sensor_data(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    tables = partitions.tables_for_range(db)
+    if len(tables) == 1:
+        table = partitions.HOT_TABLE
+        return db.execute(pagination.keyset(select(table), [table.c.data_id], cursor, skip, limit)).all()
+    return partitions.keyset_union(db, tables, lambda table: [], ["data_id"], cursor, skip, limit)
+
+def get_sensor_data_by_sensor(db: Session, sensor_id: int, start: datetime | None = None, end: datetime | None = None, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    tables = partitions.tables_for_range(db, start, end)
+    if len(tables) > 1:
+        return partitions.keyset_union(
+            db, tables, lambda table: [table.c.sensor_id == sensor_id], ["timestamp", "data_id"], cursor, skip, limit, start=start, end=end
+        )
+    table = partitions.HOT_TABLE
+    stmt = select(table).where(table.c.sensor_id == sensor_id)
+    if start is not None:
+        stmt = stmt.where(table.c.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(table.c.timestamp < end)
+    return db.execute(pagination.keyset(stmt, [table.c.timestamp, table.c.data_id], cursor, skip, limit)).all()
 
 def create_sensor_data(db: Session, sensor_data: schemas.SensorDataCreate):
-    db_sensor_data = models.SensorData(**sensor_data.model_dump())
-    db.add(db_sensor_data)
+    db_sensor_data = insert_sensor_data_rows(db, [sensor_data.model_dump()])[0]
     db.commit()
-    db.refresh(db_sensor_data)
+    readings_committed([db_sensor_data])
     return db_sensor_data
 
+def create_sensor_data_batch(db: Session, readings: list[schemas.SensorDataCreate]):
+    # Returns one inserted row per reading, or None where the sensor does not exist.
+    sensor_ids = {reading.sensor_id for reading in readings}
+    known_sensors = set(db.scalars(
+        select(models.Sensor.sensor_id).where(models.Sensor.sensor_id.in_(sensor_ids))
+    ))
+    accepted = [reading.model_dump() for reading in readings if reading.sensor_id in known_sensors]
+    rows = insert_sensor_data_rows(db, accepted)
+    db.commit()
+    readings_committed(rows)
+    inserted = iter(rows)
+    return [next(inserted) if reading.sensor_id in known_sensors else None for reading in readings]
+
+def insert_sensor_data_rows(db: Session, rows: list[dict]):
+    if not rows:
+        return []
+    stmt = insert(models.SensorData).returning(
+        *models.SensorData.__table__.columns, sort_by_parameter_order=True
+    )
+    inserted = db.execute(stmt, rows).all()
+    rollups.apply_readings(db, inserted)
+    # With health off the summaries go stale; health.seed brings them up to date when it is turned on.
+    if config.HEALTH_ENABLED:
+        health.apply_readings(db, inserted)
+    return inserted
+
+def readings_committed(rows):
+    # Post-commit fan-out for new readings, shared by every insert path.
+    latest_cache.offer(rows)
+    live.sensor_data_broadcaster.publish(rows)
+
 def update_sensor_data(db: Session, data_id: int, sensor_data: schemas.SensorDataCreate):
-    db_sensor_data = get_sensor_data(db, data_id)
-    if db_sensor_data:
-        for key, value in sensor_data.model_dump().items():
-            setattr(db_sensor_data, key, value)
-        db.commit()
-        db.refresh(db_sensor_data)
+    # The timestamp is not updatable, so a reading stays in the partition it was found in.
+    table, previous = partitions.locate(db, data_id)
+    if previous is None:
+        return None
+    db_sensor_data = db.execute(
+        update(table).where(table.c.data_id == data_id).values(**sensor_data.model_dump()).returning(*table.columns)
+    ).one()
+    rollups.rebuild_for_reading(db, previous.sensor_id, previous.timestamp)
+    if db_sensor_data.sensor_id != previous.sensor_id:
+        rollups.rebuild_for_reading(db, db_sensor_data.sensor_id, db_sensor_data.timestamp)
+    db.commit()
+    latest_cache.refresh(db, data_id, previous.sensor_id, db_sensor_data.sensor_id)
+    anomalies.invalidate(previous.sensor_id)
+    anomalies.invalidate(db_sensor_data.sensor_id)
     return db_sensor_data
 
 def delete_sensor_data(db: Session, data_id: int):
-    db_sensor_data = get_sensor_data(db, data_id)
-    if db_sensor_data:
-        db.delete(db_sensor_data)
+    table, db_sensor_data = partitions.locate(db, data_id)
+    if db_sensor_data is not None:
+        db.execute(delete(table).where(table.c.data_id == data_id))
+        if table is not partitions.HOT_TABLE:
+            db.get(models.SensorDataPartition, table.name).row_count -= 1
+        rollups.rebuild_for_reading(db, db_sensor_data.sensor_id, db_sensor_data.timestamp)
         db.commit()
+        latest_cache.refresh(db, data_id, db_sensor_data.sensor_id)
+        anomalies.invalidate(db_sensor_data.sensor_id)
     return db_sensor_data
 
+def delete_sensor_data_range(db: Session, sensor_id: int, start: datetime, end: datetime, dry_run: bool = False) -> int:
+    # One DELETE per table overlapping [start, end), all in a single transaction.
+    tables = partitions.tables_for_range(db, start, end)
+    filters = {table: [table.c.sensor_id == sensor_id, table.c.timestamp >= start, table.c.timestamp < end] for table in tables}
+    if dry_run:
+        return sum(db.scalar(select(func.count()).select_from(table).where(*filters[table])) for table in tables)
+    deleted = 0
+    for table in tables:
+        count = db.execute(delete(table).where(*filters[table])).rowcount
+        if count and table is not partitions.HOT_TABLE:
+            db.get(models.SensorDataPartition, table.name).row_count -= count
+        deleted += count
+    if deleted:
+        rollups.rebuild(db, start, end, sensor_id=sensor_id)
+    db.commit()
+    if deleted:
+        # The cached reading may be among those deleted; reload the sensor from scratch.
+        latest_cache.forget(sensor_id)
+        latest_cache.refresh(db, None, sensor_id)
+        anomalies.invalidate(sensor_id)
+    return deleted
+
 # Irrigation System CRUD operations
 def get_irrigation_system(db: Session, irrigation_id: int):
-    return db.query(models.IrrigationSystem).filter(models.IrrigationSystem.irrigation_id == irrigation_id).first()
+    return irrigation_systems.get(db, irrigation_id)
 
-def get_irrigation_systems(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.IrrigationSystem).offset(skip).limit(limit).all()
+def get_irrigation_systems(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return irrigation_systems.list(db, skip=skip, limit=limit, cursor=cursor)
 
-def get_irrigation_systems_by_farm(db: Session, farm_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.IrrigationSystem).filter(models.IrrigationSystem.farm_id == farm_id).offset(skip).limit(limit).all()
+def get_irrigation_systems_by_farm(db: Session, farm_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return irrigation_systems.list(db, models.IrrigationSystem.farm_id == farm_id, skip=skip, limit=limit, cursor=cursor)
 
 def create_irrigation_system(db: Session, irrigation: schemas.IrrigationSystemCreate):
-    db_irrigation = models.IrrigationSystem(**irrigation.model_dump())
-    db.add(db_irrigation)
-    db.commit()
-    db.refresh(db_irrigation)
-    return db_irrigation
+    return irrigation_systems.create(db, irrigation.model_dump())
 
 def update_irrigation_system(db: Session, irrigation_id: int, irrigation: schemas.IrrigationSystemCreate):
-    db_irrigation = get_irrigation_system(db, irrigation_id)
-    if db_irrigation:
-        for key, value in irrigation.model_dump().items():
-            setattr(db_irrigation, key, value)
-        db.commit()
-        db.refresh(db_irrigation)
-    return db_irrigation
+    return irrigation_systems.update(db, irrigation_id, irrigation.model_dump())
 
 def delete_irrigation_system(db: Session, irrigation_id: int):
-    db_irrigation = get_irrigation_system(db, irrigation_id)
-    if db_irrigation:
-        db.delete(db_irrigation)
-        db.commit()
-    return db_irrigation
+    return irrigation_systems.delete(db, irrigation_id)
+
+def set_irrigation_status_by_farm(db: Session, farm_id: int, status: models.IrrigationStatus, dry_run: bool = False) -> int:
+    # Systems already in the requested status are left alone and not counted.
+    irrigation = models.IrrigationSystem
+    return irrigation_systems.update_where(db, {"status": status}, irrigation.farm_id == farm_id, irrigation.status != status, dry_run=dry_run)
 
 # Weather Data CRUD operations
 def get_weather_data(db: Session, weather_id: int):
-    return db.query(models.WeatherData).filter(models.WeatherData.weather_id == weather_id).first()
+    return weather_data.get(db, weather_id)
 
-def get_weather_data_list(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.WeatherData).offset(skip).limit(limit).all()
+def get_weather_data_list(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return weather_data.list(db, skip=skip, limit=limit, cursor=cursor)
 
 def create_weather_data(db: Session, weather: schemas.WeatherDataCreate):
-    db_weather = models.WeatherData(**weather.model_dump())
-    db.add(db_weather)
-    db.commit()
-    db.refresh(db_weather)
-    return db_weather
+    return weather_data.create(db, weather.model_dump())
 
 def update_weather_data(db: Session, weather_id: int, weather: schemas.WeatherDataCreate):
-    db_weather = get_weather_data(db, weather_id)
-    if db_weather:
-        for key, value in weather.model_dump().items():
-            setattr(db_weather, key, value)
-        db.commit()
-        db.refresh(db_weather)
-    return db_weather
+    return weather_data.update(db, weather_id, weather.model_dump())
 
 def delete_weather_data(db: Session, weather_id: int):
-    db_weather = get_weather_data(db, weather_id)
-    if db_weather:
-        db.delete(db_weather)
-        db.commit()
-    return db_weather
+    return weather_data.delete(db, weather_id)
 
 # Crop Management CRUD operations
 def get_crop(db: Session, crop_id: int):
-    return db.query(models.CropManagement).filter(models.CropManagement.crop_id == crop_id).first()
+    return crops.get(db, crop_id)
 
-def get_crops(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.CropManagement).offset(skip).limit(limit).all()
+def get_crops(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return crops.list(db, skip=skip, limit=limit, cursor=cursor)
 
 def create_crop(db: Session, crop: schemas.CropManagementCreate):
-    db_crop = models.CropManagement(**crop.model_dump())
-    db.add(db_crop)
-    db.commit()
-    db.refresh(db_crop)
-    return db_crop
+    return crops.create(db, crop.model_dump())
 
 def update_crop(db: Session, crop_id: int, crop: schemas.CropManagementCreate):
-    db_crop = get_crop(db, crop_id)
-    if db_crop:
-        for key, value in crop.model_dump().items():
-            setattr(db_crop, key, value)
-        db.commit()
-        db.refresh(db_crop)
-    return db_crop
+    return crops.update(db, crop_id, crop.model_dump())
 
 def delete_crop(db: Session, crop_id: int):
-    db_crop = get_crop(db, crop_id)
-    if db_crop:
-        db.delete(db_crop)
-        db.commit()
-    return db_crop
+    return crops.delete(db, crop_id)
 
 # Fertilization System CRUD operations
 def get_fertilization_system(db: Session, fertilization_id: int):
-    return db.query(models.FertilizationSystem).filter(models.FertilizationSystem.fertilization_id == fertilization_id).first()
+    return fertilization_systems.get(db, fertilization_id)
 
-def get_fertilization_systems(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.FertilizationSystem).offset(skip).limit(limit).all()
+def get_fertilization_systems(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return fertilization_systems.list(db, skip=skip, limit=limit, cursor=cursor)
 
-def get_fertilization_systems_by_farm(db: Session, farm_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.FertilizationSystem).filter(models.FertilizationSystem.farm_id == farm_id).offset(skip).limit(limit).all()
+def get_fertilization_systems_by_farm(db: Session, farm_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return fertilization_systems.list(db, models.FertilizationSystem.farm_id == farm_id, skip=skip, limit=limit, cursor=cursor)
 
 def create_fertilization_system(db: Session, fertilization: schemas.FertilizationSystemCreate):
-    db_fertilization = models.FertilizationSystem(**fertilization.model_dump())
-    db.add(db_fertilization)
-    db.commit()
-    db.refresh(db_fertilization)
-    return db_fertilization
+    return fertilization_systems.create(db, fertilization.model_dump())
 
 def update_fertilization_system(db: Session, fertilization_id: int, fertilization: schemas.FertilizationSystemCreate):
-    db_fertilization = get_fertilization_system(db, fertilization_id)
-    if db_fertilization:
-        for key, value in fertilization.model_dump().items():
-            setattr(db_fertilization, key, value)
-        db.commit()
-        db.refresh(db_fertilization)
-    return db_fertilization
+    return fertilization_systems.update(db, fertilization_id, fertilization.model_dump())
 
 def delete_fertilization_system(db: Session, fertilization_id: int):
-    db_fertilization = get_fertilization_system(db, fertilization_id)
-    if db_fertilization:
-        db.delete(db_fertilization)
-        db.commit()
-    return db_fertilization
+    return fertilization_systems.delete(db, fertilization_id)
 
 # Pest & Disease Detection CRUD operations
 def get_pest_disease_detection(db: Session, detection_id: int):
-    return db.query(models.PestDiseaseDetection).filter(models.PestDiseaseDetection.detection_id == detection_id).first()
+    return pest_disease_detections.get(db, detection_id)
 
-def get_pest_disease_detections(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.PestDiseaseDetection).offset(skip).limit(limit).all()
+def get_pest_disease_detections(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return pest_disease_detections.list(db, skip=skip, limit=limit, cursor=cursor)
 
-def get_pest_disease_detections_by_crop(db: Session, crop_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.PestDiseaseDetection).filter(models.PestDiseaseDetection.crop_id == crop_id).offset(skip).limit(limit).all()
+def get_pest_disease_detections_by_crop(db: Session, crop_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return pest_disease_detections.list(db, models.PestDiseaseDetection.crop_id == crop_id, skip=skip, limit=limit, cursor=cursor)
 
 def create_pest_disease_detection(db: Session, detection: schemas.PestDiseaseDetectionCreate):
-    db_detection = models.PestDiseaseDetection(**detection.model_dump())
-    db.add(db_detection)
-    db.commit()
-    db.refresh(db_detection)
-    return db_detection
+    return pest_disease_detections.create(db, detection.model_dump())
 
 def update_pest_disease_detection(db: Session, detection_id: int, detection: schemas.PestDiseaseDetectionCreate):
-    db_detection = get_pest_disease_detection(db, detection_id)
-    if db_detection:
-        for key, value in detection.model_dump().items():
-            setattr(db_detection, key, value)
-        db.commit()
-        db.refresh(db_detection)
-    return db_detection
+    return pest_disease_detections.update(db, detection_id, detection.model_dump())
 
 def delete_pest_disease_detection(db: Session, detection_id: int):
-    db_detection = get_pest_disease_detection(db, detection_id)
-    if db_detection:
-        db.delete(db_detection)
-        db.commit()
-    return db_detection
+    return pest_disease_detections.delete(db, detection_id)
+
+def delete_pest_disease_detections_by_crop(db: Session, crop_id: int, dry_run: bool = False) -> int:
+    return pest_disease_detections.delete_where(db, models.PestDiseaseDetection.crop_id == crop_id, dry_run=dry_run)
 
 # Supply Chain Transaction CRUD operations
 def get_supply_chain_transaction(db: Session, transaction_id: int):
-    return db.query(models.SupplyChainTransaction).filter(models.SupplyChainTransaction.transaction_id == transaction_id).first()
+    return supply_chain_transactions.get(db, transaction_id)
 
-def get_supply_chain_transactions(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.SupplyChainTransaction).offset(skip).limit(limit).all()
+def get_supply_chain_transactions(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return supply_chain_transactions.list(db, skip=skip, limit=limit, cursor=cursor)
 
-def get_supply_chain_transactions_by_crop(db: Session, crop_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.SupplyChainTransaction).filter(models.SupplyChainTransaction.crop_id == crop_id).offset(skip).limit(limit).all()
+def get_supply_chain_transactions_by_crop(db: Session, crop_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return supply_chain_transactions.list(db, models.SupplyChainTransaction.crop_id == crop_id, skip=skip, limit=limit, cursor=cursor)
 
 def create_supply_chain_transaction(db: Session, transaction: schemas.SupplyChainTransactionCreate):
-    db_transaction = models.SupplyChainTransaction(**transaction.model_dump())
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    return supply_chain_transactions.create(db, transaction.model_dump())
 
 def update_supply_chain_transaction(db: Session, transaction_id: int, transaction: schemas.SupplyChainTransactionCreate):
-    db_transaction = get_supply_chain_transaction(db, transaction_id)
-    if db_transaction:
-        for key, value in transaction.model_dump().items():
-            setattr(db_transaction, key, value)
-        db.commit()
-        db.refresh(db_transaction)
-    return db_transaction
+    return supply_chain_transactions.update(db, transaction_id, transaction.model_dump())
 
 def delete_supply_chain_transaction(db: Session, transaction_id: int):
-    db_transaction = get_supply_chain_transaction(db, transaction_id)
-    if db_transaction:
-        db.delete(db_transaction)
-        db.commit()
-    return db_transaction
\ No newline at end of file
+    return supply_chain_transactions.delete(db, transaction_id)
\ No newline at end of file
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+import schemas
+
+# Sensor-data paths hand the sync crud functions to run_sync: the partition routing, rollup
+# and health upserts stay in one place, and every query still awaits the async driver.
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
+
+async def update_password_hash(db: AsyncSession, user_id: int, hashed_password: str):
+    await db.execute(update(models.User).where(models.User.user_id == user_id).values(hashed_password=hashed_password))
+    await db.commit()
+
+async def get_sensor_data(db: AsyncSession, data_id: int):
+    return await db.run_sync(crud.get_sensor_data, data_id)
+
+async def get_all_sensor_data(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return await db.run_sync(lambda session: crud.get_all_sensor_data(session, skip=skip, limit=limit, cursor=cursor))
+
+async def get_sensor_data_by_sensor(db: AsyncSession, sensor_id: int, start: datetime | None = None, end: datetime | None = None, skip: int = 0, limit: int = 100, cursor: str | None = None):
+    return await db.run_sync(
+        lambda session: crud.get_sensor_data_by_sensor(session, sensor_id, start=start, end=end, skip=skip, limit=limit, cursor=cursor)
+    )
+
+async def create_sensor_data(db: AsyncSession, sensor_data: schemas.SensorDataCreate):
+    return await db.run_sync(crud.create_sensor_data, sensor_data)
+
+async def create_sensor_data_batch(db: AsyncSession, readings: list[schemas.SensorDataCreate]):
+    return await db.run_sync(crud.create_sensor_data_batch, readings)
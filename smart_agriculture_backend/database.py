@@ -1,20 +1,180 @@
-from sqlalchemy import create_engine
+import itertools
+import threading
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import config
+import metrics
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+def sqlite_pragmas() -> dict:
+    return {
+        # Must precede journal_mode: a fresh file cannot change auto_vacuum once it is in WAL mode
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        "cache_size": config.SQLITE_CACHE_SIZE,
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+    }
+
+def sqlite_read_pragmas() -> dict:
+    # Read engines never write, so only the read-side settings apply
+    return {
+        "query_only": "ON",
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        "cache_size": config.SQLITE_CACHE_SIZE,
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+    }
+
+def make_engine(url: str, pragmas: dict | None = None, factory=create_engine):
+    # factory is create_engine or create_async_engine; both take the same pool options.
+    url = make_url(url)
+    options = {"pool_pre_ping": config.DB_POOL_PRE_PING, "pool_recycle": config.DB_POOL_RECYCLE_S}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single shared connection, so there is no pool to size.
+            return factory(url, poolclass=StaticPool, **options)
+    options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW, pool_timeout=config.DB_POOL_TIMEOUT_S)
+    engine = factory(url, **options)
+    if url.get_backend_name() == "sqlite" and pragmas:
+        @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+    return engine
+
+def async_url(url: str) -> str:
+    # Same database through its asyncio driver: aiosqlite for SQLite, asyncpg for Postgres.
+    url = make_url(url)
+    drivers = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+    return url.set(drivername=drivers.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+def read_only_url(url: str) -> str:
+    # The same SQLite file opened through a read-only URI
+    url = make_url(url)
+    return url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"}).render_as_string(hide_password=False)
+
+def read_urls() -> list[str]:
+    if config.DATABASE_READ_URLS:
+        return config.DATABASE_READ_URLS
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    if config.SQLITE_READ_ENGINE and url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        return [read_only_url(SQLALCHEMY_DATABASE_URL)]
+    return []
+
+def instrument(engine, name: str):
+    # Per-engine pool usage under db.<name>.*, e.g. db.primary.checked_out or db.read0.checkouts
+    pool = getattr(engine, "sync_engine", engine).pool
+    lock = threading.Lock()
+    in_use = [0]
+
+    def track(delta: int):
+        with lock:
+            in_use[0] += delta
+            metrics.set_gauge(f"db.{name}.checked_out", in_use[0])
+
+    # Only QueuePool has a size() method; SingletonThreadPool (used for :memory:) keeps an int attribute.
+    if callable(getattr(pool, "size", None)):
+        metrics.set_gauge(f"db.{name}.pool_size", pool.size())
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.inc(f"db.{name}.connections_opened")
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./smart_agriculture.db"
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.inc(f"db.{name}.checkouts")
+        track(1)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        track(-1)
+
+    return engine
+
+def _pragmas(url: str, read: bool) -> dict | None:
+    if not config.SQLITE_PRAGMAS or make_url(url).get_backend_name() != "sqlite":
+        return None
+    return sqlite_read_pragmas() if read else sqlite_pragmas()
+
+engine = instrument(make_engine(SQLALCHEMY_DATABASE_URL, _pragmas(SQLALCHEMY_DATABASE_URL, read=False)), "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engines = [
+    instrument(make_engine(url, _pragmas(url, read=True)), f"read{index}")
+    for index, url in enumerate(read_urls())
+]
+_read_sessions = itertools.cycle([sessionmaker(autocommit=False, autoflush=False, bind=read_engine) for read_engine in read_engines] or [SessionLocal])
+
+def ReadSessionLocal():
+    # Round-robin over the read engines; the primary when none are configured
+    return next(_read_sessions)()
+
+# Only built in async mode, so aiosqlite/asyncpg stay optional otherwise
+async_engine = None
+AsyncSessionLocal = None
+_async_read_sessions = None
+if config.ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    primary_async_url = config.ASYNC_DATABASE_URL or async_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = instrument(make_engine(primary_async_url, _pragmas(primary_async_url, read=False), factory=create_async_engine), "primary_async")
+    # Rows handed to the response must stay readable after commit without another round trip
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    _async_read_sessions = itertools.cycle([
+        async_sessionmaker(
+            instrument(make_engine(async_url(url), _pragmas(url, read=True), factory=create_async_engine), f"read{index}_async"),
+            autoflush=False, expire_on_commit=False,
+        )
+        for index, url in enumerate(read_urls())
+    ] or [AsyncSessionLocal])
+
 Base = declarative_base()
 
+def init_db():
+    if engine.dialect.name == "sqlite":
+        # Only takes effect on a fresh file; lets retention shrink it with incremental_vacuum
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    Base.metadata.create_all(bind=engine)
+    # create_all() skips indexes on tables that already exist, so add new ones explicitly
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def dialect_insert(db):
+    # INSERT construct with ON CONFLICT support for the session's backend
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+READ_METHODS = frozenset({"GET", "HEAD"})
+# Sent by a client that must see its own just-committed writes; sends the read to the primary
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes"
+
+def reads_from_replica(request: Request) -> bool:
+    return request.method in READ_METHODS and request.headers.get(READ_YOUR_WRITES_HEADER, "").lower() not in ("1", "true", "yes")
+
 # Dependency
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    db = ReadSessionLocal() if reads_from_replica(request) else SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db(request: Request):
+    sessions = next(_async_read_sessions) if reads_from_replica(request) else AsyncSessionLocal
+    async with sessions() as db:
+        yield db
@@ -0,0 +1,180 @@
+import argparse
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import partitions
+from database import ReadSessionLocal, SessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+COLUMNS = ("data_id", "sensor_id", "temperature", "humidity", "soil_moisture", "ph_level", "timestamp")
+
+NUMPY_DTYPES = {
+    "data_id": np.dtype("<i8"),
+    "sensor_id": np.dtype("<i8"),
+    "temperature": np.dtype("<f8"),
+    "humidity": np.dtype("<f8"),
+    "soil_moisture": np.dtype("<f8"),
+    "ph_level": np.dtype("<f8"),
+    "timestamp": np.dtype("<M8[us]"),
+}
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "npz": ("application/octet-stream", "npz"),
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+# Rows held in memory per batch; the export route rejects anything larger
+MAX_CHUNK_SIZE = 500000
+
+# pyarrow is optional; without it exports and archives default to npz, which needs only numpy
+DEFAULT_FORMAT = "parquet" if pa is not None else "npz"
+
+class ExportError(ValueError):
+    pass
+
+def check_format(format: str):
+    if format not in FORMATS:
+        raise ExportError(f"Unknown export format {format!r}, expected one of {', '.join(FORMATS)}")
+    if format in ("arrow", "parquet") and pa is None:
+        raise ExportError(f"{format} export needs pyarrow installed, use format=npz instead")
+
+def iter_chunks(db: Session, start: datetime | None = None, end: datetime | None = None, sensor_id: int | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE, tables: list | None = None):
+    # yield_per keeps a server-side cursor open and hands back one chunk of tuples at a time.
+    # Partitions are read one after another, oldest month first, then the hot table.
+    if tables is None:
+        tables = partitions.tables_for_range(db, start, end)
+    for table in tables:
+        stmt = select(*(table.c[name] for name in COLUMNS))
+        if start is not None:
+            stmt = stmt.where(table.c.timestamp >= start)
+        if end is not None:
+            stmt = stmt.where(table.c.timestamp < end)
+        if sensor_id is not None:
+            stmt = stmt.where(table.c.sensor_id == sensor_id)
+        stmt = stmt.order_by(table.c.data_id).execution_options(yield_per=chunk_size)
+        for rows in db.execute(stmt).partitions():
+            yield list(zip(*rows))
+
+class _ChunkSink:
+    # Write-only file object whose contents are handed out and dropped after every batch.
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+def _arrow_schema():
+    return pa.schema([
+        ("data_id", pa.int64()),
+        ("sensor_id", pa.int64()),
+        ("temperature", pa.float64()),
+        ("humidity", pa.float64()),
+        ("soil_moisture", pa.float64()),
+        ("ph_level", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+def _record_batch(columns, schema):
+    return pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+def stream_arrow(chunks):
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for columns in chunks:
+            writer.write_batch(_record_batch(columns, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def stream_parquet(chunks):
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+        for columns in chunks:
+            writer.write_batch(_record_batch(columns, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def stream_npz(chunks, copy_size: int = 1 << 20):
+    # Columns are spooled to per-column temp files, then copied into the archive, so only
+    # one chunk is ever held in memory.
+    spool = tempfile.TemporaryDirectory()
+    try:
+        files = {name: open(os.path.join(spool.name, name), "w+b") for name in COLUMNS}
+        rows = 0
+        for columns in chunks:
+            for name, values in zip(COLUMNS, columns):
+                files[name].write(np.array(values, dtype=NUMPY_DTYPES[name]).tobytes())
+            rows += len(columns[0])
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, spooled in files.items():
+                spooled.seek(0)
+                header = {"descr": np.lib.format.dtype_to_descr(NUMPY_DTYPES[name]), "fortran_order": False, "shape": (rows,)}
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(member, header)
+                    while True:
+                        data = spooled.read(copy_size)
+                        if not data:
+                            break
+                        member.write(data)
+                        yield sink.drain()
+                spooled.close()
+        yield sink.drain()
+    finally:
+        spool.cleanup()
+
+def stream_export(db: Session, format: str, start: datetime | None = None, end: datetime | None = None, sensor_id: int | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE, tables: list | None = None):
+    check_format(format)
+    chunks = iter_chunks(db, start=start, end=end, sensor_id=sensor_id, chunk_size=chunk_size, tables=tables)
+    writer = {"arrow": stream_arrow, "parquet": stream_parquet, "npz": stream_npz}[format]
+    for data in writer(chunks):
+        if data:
+            yield data
+
+def stream_export_in_session(format: str, **filters):
+    # The response body outlives the request's session, so the stream opens its own on a read engine.
+    with ReadSessionLocal() as db:
+        yield from stream_export(db, format, **filters)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export sensor_data as Arrow IPC, Parquet or NumPy .npz")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=list(FORMATS), default=DEFAULT_FORMAT)
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--sensor-id", type=int)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    with open(args.output, "wb") as out, SessionLocal() as db:
+        chunks = stream_export(db, args.format, start=args.start, end=args.end, sensor_id=args.sensor_id, chunk_size=args.chunk_size)
+        for data in chunks:
+            out.write(data)
+    print(f"Wrote {args.output}")
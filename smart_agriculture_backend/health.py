@@ -0,0 +1,140 @@
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, not_, or_, select, update
+from sqlalchemy.orm import Session
+
+import config
+import latest_cache
+import metrics
+import models
+import schemas
+from database import SessionLocal, dialect_insert, init_db
+
+logger = logging.getLogger(__name__)
+
+METRICS = tuple(schemas.SENSOR_LIMITS)
+
+def _at_limit(row) -> bool:
+    for metric, (low, high) in schemas.SENSOR_LIMITS.items():
+        value = getattr(row, metric)
+        if value is None:
+            continue
+        if (low is not None and value <= low) or (high is not None and value >= high):
+            return True
+    return False
+
+def _advance(state: dict | None, row) -> dict:
+    values = {metric: getattr(row, metric) for metric in METRICS}
+    at_limit = _at_limit(row)
+    if state is None:
+        return {
+            "sensor_id": row.sensor_id, "last_data_id": row.data_id, "last_reading_at": row.timestamp, **values,
+            "flat_since": row.timestamp, "flat_count": 1,
+            "at_limit_since": row.timestamp if at_limit else None, "at_limit_count": 1 if at_limit else 0,
+        }
+    flat = all(state[metric] == value for metric, value in values.items())
+    return {
+        "sensor_id": row.sensor_id, "last_data_id": row.data_id, "last_reading_at": row.timestamp, **values,
+        "flat_since": state["flat_since"] if flat else row.timestamp,
+        "flat_count": state["flat_count"] + 1 if flat else 1,
+        "at_limit_since": (state["at_limit_since"] or row.timestamp) if at_limit else None,
+        "at_limit_count": state["at_limit_count"] + 1 if at_limit else 0,
+    }
+
+def apply_readings(db: Session, rows):
+    # Folds newly inserted readings into each sensor's summary within the caller's transaction.
+    # Readings at or before the stored (last_reading_at, last_data_id) are ignored, so replays are harmless.
+    rows = sorted((row for row in rows if row is not None), key=lambda row: (row.timestamp, row.data_id))
+    if not rows:
+        return
+    table = models.SensorHealth.__table__
+    sensor_ids = {row.sensor_id for row in rows}
+    current = db.execute(select(table).where(table.c.sensor_id.in_(sensor_ids)).with_for_update()).mappings()
+    states = {state["sensor_id"]: dict(state) for state in current}
+    changed = {}
+    for row in rows:
+        state = states.get(row.sensor_id)
+        if state is not None and (row.timestamp, row.data_id) <= (state["last_reading_at"], state["last_data_id"]):
+            continue
+        states[row.sensor_id] = changed[row.sensor_id] = _advance(state, row)
+    if not changed:
+        return
+    stmt = dialect_insert(db)(table)
+    summary_columns = [column.name for column in table.columns if column.name not in ("sensor_id", "fault_reason")]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.sensor_id],
+        set_={name: stmt.excluded[name] for name in summary_columns},
+    )
+    db.execute(stmt, [{name: state[name] for name in ["sensor_id", *summary_columns]} for state in changed.values()])
+
+def _fault_conditions(now: datetime):
+    health = models.SensorHealth
+    silent = health.last_reading_at < now - timedelta(seconds=config.HEALTH_SILENT_AFTER_S)
+    flatline = and_(health.flat_count >= config.HEALTH_MIN_RUN, health.flat_since < now - timedelta(seconds=config.HEALTH_FLATLINE_AFTER_S))
+    at_limit = and_(health.at_limit_count >= config.HEALTH_MIN_RUN, health.at_limit_since < now - timedelta(seconds=config.HEALTH_AT_LIMIT_AFTER_S))
+    return silent, flatline, at_limit
+
+def evaluate(db: Session, now: datetime | None = None) -> dict:
+    # Four set-based UPDATEs per pass, whatever the number of sensors. Only sensors this
+    # evaluator marked faulty (fault_reason set) are ever switched back to active.
+    now = now or datetime.utcnow()
+    health = models.SensorHealth
+    sensor = models.Sensor
+    silent, flatline, at_limit = _fault_conditions(now)
+    failing = or_(silent, flatline, at_limit)
+    unsynced = {"synchronize_session": False}
+
+    recovered_ids = select(health.sensor_id).where(health.fault_reason.isnot(None), not_(failing))
+    recovered = db.execute(
+        update(sensor).where(sensor.status == models.SensorStatus.faulty, sensor.sensor_id.in_(recovered_ids))
+        .values(status=models.SensorStatus.active, last_updated=now).execution_options(**unsynced)
+    ).rowcount
+    db.execute(update(health).where(health.fault_reason.isnot(None), not_(failing)).values(fault_reason=None).execution_options(**unsynced))
+
+    active_ids = select(sensor.sensor_id).where(sensor.status == models.SensorStatus.active)
+    reason = case((silent, "silent"), (at_limit, "at_limit"), (flatline, "flatline"))
+    db.execute(
+        update(health).where(health.fault_reason.is_(None), failing, health.sensor_id.in_(active_ids))
+        .values(fault_reason=reason).execution_options(**unsynced)
+    )
+    faulted = db.execute(
+        update(sensor).where(sensor.status == models.SensorStatus.active, sensor.sensor_id.in_(select(health.sensor_id).where(health.fault_reason.isnot(None))))
+        .values(status=models.SensorStatus.faulty, last_updated=now).execution_options(**unsynced)
+    ).rowcount
+    db.commit()
+    metrics.inc("health.faulted", faulted)
+    metrics.inc("health.recovered", recovered)
+    if faulted or recovered:
+        logger.info("Sensor health pass: %d marked faulty, %d recovered", faulted, recovered)
+    return {"faulted": faulted, "recovered": recovered}
+
+def seed(db: Session):
+    # Sensors that reported before this table existed start from their latest reading.
+    apply_readings(db, latest_cache.get_latest(db))
+    db.commit()
+
+def clear_fault(db: Session, sensor_id: int):
+    # A status set by hand is the operator's call; the evaluator no longer owns this sensor's fault.
+    db.execute(update(models.SensorHealth).where(models.SensorHealth.sensor_id == sensor_id).values(fault_reason=None).execution_options(synchronize_session=False))
+
+def get_health(db: Session, sensor_id: int):
+    return db.get(models.SensorHealth, sensor_id)
+
+def run_scheduled():
+    with SessionLocal() as db:
+        evaluate(db)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed sensor health summaries or run one fault evaluation pass")
+    parser.add_argument("command", choices=["seed", "evaluate"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    with SessionLocal() as db:
+        if args.command == "seed":
+            seed(db)
+            print("Seeded sensor health from the latest readings")
+        else:
+            print(evaluate(db))
@@ -0,0 +1,32 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class PeriodicJob:
+    def __init__(self, name: str, interval_s: float, target):
+        self.name = name
+        self.interval_s = interval_s
+        self.target = target
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.target()
+            except Exception:
+                logger.exception("Periodic job %s failed", self.name)
@@ -0,0 +1,94 @@
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import metrics
+import models
+import partitions
+
+# Last committed reading per sensor_id, held as the Row returned by the insert.
+# One uvicorn process owns the cache; every write path in that process feeds it.
+_latest = {}
+_lock = threading.Lock()
+_warmed = False
+
+def _newer(row, current) -> bool:
+    return current is None or (row.timestamp, row.data_id) >= (current.timestamp, current.data_id)
+
+def offer(rows):
+    # Called after commit with freshly inserted readings; keeps whichever is newest per sensor.
+    with _lock:
+        for row in rows:
+            if row is not None and _newer(row, _latest.get(row.sensor_id)):
+                _latest[row.sensor_id] = row
+
+def _latest_in(db: Session, table, sensor_ids: list[int] | None = None):
+    # One index seek on (sensor_id, timestamp) per sensor instead of sorting the readings.
+    sensor = models.Sensor.__table__
+    newest = (
+        select(table.c.data_id)
+        .where(table.c.sensor_id == sensor.c.sensor_id)
+        .order_by(table.c.timestamp.desc(), table.c.data_id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    ids = select(newest).select_from(sensor)
+    if sensor_ids is not None:
+        ids = ids.where(sensor.c.sensor_id.in_(sensor_ids))
+    return db.execute(select(table).where(table.c.data_id.in_(ids))).all()
+
+def _load(db: Session, sensor_ids: list[int] | None = None) -> dict:
+    # The hot table answers for every sensor that reported this month; partitions are only
+    # consulted, newest first, for sensors that have gone quiet since.
+    found = {row.sensor_id: row for row in _latest_in(db, partitions.HOT_TABLE, sensor_ids)}
+    sealed = partitions.tables_for_range(db)[:-1]
+    if not sealed:
+        return found
+    wanted = set(db.scalars(select(models.Sensor.sensor_id))) if sensor_ids is None else set(sensor_ids)
+    for table in reversed(sealed):
+        missing = wanted - found.keys()
+        if not missing:
+            break
+        for row in _latest_in(db, table, sorted(missing)):
+            found[row.sensor_id] = row
+    return found
+
+def warm(db: Session):
+    global _warmed
+    loaded = _load(db)
+    with _lock:
+        for sensor_id, row in loaded.items():
+            if _newer(row, _latest.get(sensor_id)):
+                _latest[sensor_id] = row
+        _warmed = True
+    metrics.set_gauge("latest_cache.sensors", len(_latest))
+
+def refresh(db: Session, data_id: int, *sensor_ids: int):
+    # After reading data_id was updated or deleted, drop it if cached and reload those sensors.
+    # Rows inserted meanwhile by other requests still win if they are newer.
+    loaded = _load(db, list(sensor_ids))
+    with _lock:
+        for sensor_id in sensor_ids:
+            current = _latest.get(sensor_id)
+            if current is not None and current.data_id == data_id:
+                current = None
+            row = loaded.get(sensor_id)
+            if row is not None and _newer(row, current):
+                current = row
+            if current is None:
+                _latest.pop(sensor_id, None)
+            else:
+                _latest[sensor_id] = current
+
+def forget(sensor_id: int):
+    with _lock:
+        _latest.pop(sensor_id, None)
+
+def get_latest(db: Session) -> list:
+    if not _warmed:
+        warm(db)
+    with _lock:
+        rows = list(_latest.values())
+    metrics.inc("latest_cache.reads")
+    return sorted(rows, key=lambda row: row.sensor_id)
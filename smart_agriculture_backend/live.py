@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import config
+import metrics
+import schemas
+
+_DROPPED = object()
+
+class TooManySubscribers(Exception):
+    pass
+
+class Subscription:
+    def __init__(self, sensor_ids: frozenset | None, queue_size: int):
+        self.sensor_ids = sensor_ids
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def wants(self, sensor_id: int) -> bool:
+        return self.sensor_ids is None or sensor_id in self.sensor_ids
+
+class Broadcaster:
+    # Subscriptions are only touched on the event loop; writer threads hand frames over
+    # with call_soon_threadsafe, so publishing never blocks ingest on a slow client.
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions = set()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, sensor_ids: list[int] | None = None) -> Subscription:
+        if len(self._subscriptions) >= self.max_subscribers:
+            metrics.inc("live.rejected")
+            raise TooManySubscribers()
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+        subscription = Subscription(frozenset(sensor_ids) if sensor_ids else None, self.queue_size)
+        self._subscriptions.add(subscription)
+        metrics.set_gauge("live.subscribers", len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+        metrics.set_gauge("live.subscribers", len(self._subscriptions))
+
+    def publish(self, rows):
+        # Called from writer threads after commit. Each reading is serialized once,
+        # however many subscribers receive it.
+        with self._lock:
+            loop = self._loop
+        if loop is None or not self._subscriptions:
+            return
+        frames = [
+            (row.sensor_id, f"id: {row.data_id}\nevent: reading\ndata: {schemas.SensorData.model_validate(row).model_dump_json()}\n\n".encode())
+            for row in rows if row is not None
+        ]
+        try:
+            loop.call_soon_threadsafe(self._fan_out, frames)
+        except RuntimeError:
+            # The loop has shut down; there is nobody left to push to.
+            pass
+
+    def _fan_out(self, frames: list):
+        for subscription in list(self._subscriptions):
+            for sensor_id, frame in frames:
+                if not subscription.wants(sensor_id):
+                    continue
+                try:
+                    subscription.queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    self._drop(subscription)
+                    break
+        metrics.inc("live.frames_published", len(frames))
+
+    def _drop(self, subscription: Subscription):
+        # A client that cannot keep up loses its backlog and gets disconnected.
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(_DROPPED)
+        self.unsubscribe(subscription)
+        metrics.inc("live.dropped")
+
+    async def events(self, subscription: Subscription):
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), config.LIVE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection.
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is _DROPPED:
+                    yield b"event: dropped\ndata: {\"detail\": \"Client too slow, reconnect\"}\n\n"
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+sensor_data_broadcaster = Broadcaster(config.LIVE_QUEUE_SIZE, config.LIVE_MAX_SUBSCRIBERS)
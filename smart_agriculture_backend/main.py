@@ -1,17 +1,45 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, Depends, HTTPException, Body, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi import status
-
-import models, schemas, crud
-from database import SessionLocal, engine
-
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+from fastapi.concurrency import run_in_threadpool
+
+import models, schemas, crud, aggregation, anomalies, compression, config, export, fast_json, health, jobs, latest_cache, live, metrics, pagination, partitions, passwords, principals, retention, rollups, versions, write_behind
+from database import SessionLocal, get_db, init_db
+
+init_db()
+
+retention_job = jobs.PeriodicJob("sensor-data-retention", config.RETENTION_INTERVAL_S, retention.run_scheduled)
+health_job = jobs.PeriodicJob("sensor-health", config.HEALTH_INTERVAL_S, health.run_scheduled)
+seal_job = jobs.PeriodicJob("sensor-data-seal", config.PARTITION_SEAL_INTERVAL_S, partitions.run_scheduled)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with SessionLocal() as db:
+        latest_cache.warm(db)
+        if config.HEALTH_ENABLED:
+            health.seed(db)
+    if config.SENSOR_DATA_INGEST_MODE == "write_behind":
+        write_behind.sensor_data_queue.start()
+    if partitions.enabled():
+        seal_job.start()
+    if config.RETENTION_ENABLED:
+        retention_job.start()
+    if config.HEALTH_ENABLED:
+        health_job.start()
+    yield
+    health_job.stop()
+    retention_job.stop()
+    seal_job.stop()
+    write_behind.sensor_data_queue.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS for frontend (like Streamlit)
 app.add_middleware(
@@ -20,28 +48,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER],
 )
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+app.add_middleware(compression.CompressionMiddleware)
+
+@app.exception_handler(pagination.InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: pagination.InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(aggregation.AggregationError)
+def aggregation_error_handler(request: Request, exc: aggregation.AggregationError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(export.ExportError)
+def export_error_handler(request: Request, exc: export.ExportError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(passwords.PasswordPoolBusy)
+def password_pool_busy_handler(request: Request, exc: passwords.PasswordPoolBusy):
+    return JSONResponse(status_code=503, content={"detail": "Too many logins in progress, retry later"}, headers={"Retry-After": "1"})
+
+# ----- METRICS -----
+
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
 
 # ----- USERS -----
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(crud.get_user_by_email, db, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    # Awaited like /register, so a pending hash holds no request thread and the pool's 503 is the real limit
+    hashed_password = await passwords.hash_password_async(user.password)
+    # The unique index on users.email only settles two requests racing past the lookup
+    try:
+        return await run_in_threadpool(crud.create_user, db, user, hashed_password)
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
 
 @app.get("/users/", response_model=list[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_users(db, skip=skip, limit=limit)
+def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_users(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "user_id")
+    return rows
 
 @app.get("/users/{user_id}", response_model=schemas.User)
 def read_user(user_id: int, db: Session = Depends(get_db)):
@@ -52,40 +105,30 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
 
 @app.put("/users/{user_id}", response_model=schemas.User)
 def update_user(user_id: int, user_update: schemas.UserBase, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
+    user = crud.update_user(db, user_id, user_update)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user.name = user_update.name
-    user.email = user_update.email
-    user.role = user_update.role
-    db.commit()
-    db.refresh(user)
+    principals.invalidate_user(user_id)
     return user
 
 @app.delete("/users/{user_id}")
 def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
+    if not crud.delete_user(db, user_id):
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    principals.invalidate_user(user_id)
     return {"message": "User deleted successfully"}
 
 @app.post("/register")
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing_user:
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    # Indexed lookup first, so a duplicate is turned away before it costs a bcrypt hash
+    if await run_in_threadpool(crud.get_user_by_email, db, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed_password = await passwords.hash_password_async(user.password)
+    try:
+        await run_in_threadpool(crud.create_user, db, user, hashed_password)
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        name=user.name,
-        email=user.email,
-        hashed_password=hashed_password,
-        role=user.role
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
     return {"message": "User registered successfully"}
 
 # ----- SENSORS -----
@@ -94,48 +137,148 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 def create_sensor(sensor: schemas.SensorCreate, db: Session = Depends(get_db)):
     return crud.create_sensor(db=db, sensor=sensor)
 
-@app.get("/sensors/", response_model=list[schemas.Sensor])
-def read_sensors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_sensors(db, skip=skip, limit=limit)
+@app.get("/sensors/", response_model=list[schemas.Sensor], dependencies=[Depends(versions.conditional(models.Sensor))])
+def read_sensors(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_sensors(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "sensor_id")
+    return rows
+
+@app.get("/sensors/latest", response_model=list[schemas.SensorData])
+def read_latest_sensor_data(db: Session = Depends(get_db)):
+    return latest_cache.get_latest(db)
 
-@app.get("/sensors/{sensor_id}", response_model=schemas.Sensor)
+@app.get("/sensors/{sensor_id}", response_model=schemas.Sensor, dependencies=[Depends(versions.conditional(models.Sensor))])
 def read_sensor(sensor_id: int, db: Session = Depends(get_db)):
     sensor = crud.get_sensor(db, sensor_id=sensor_id)
     if not sensor:
         raise HTTPException(status_code=404, detail="Sensor not found")
     return sensor
 
+@app.get("/sensors/{sensor_id}/anomalies", response_model=list[schemas.SensorAnomaly])
+def read_sensor_anomalies(sensor_id: int, start: datetime | None = None, end: datetime | None = None, metric: list[str] | None = Query(None), db: Session = Depends(get_db)):
+    if not crud.get_sensor(db, sensor_id=sensor_id):
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    return anomalies.detect(db, sensor_id, start=start, end=end, metric_names=metric)
+
+@app.get("/sensors/{sensor_id}/health", response_model=schemas.SensorHealth)
+def read_sensor_health(sensor_id: int, db: Session = Depends(get_db)):
+    summary = health.get_health(db, sensor_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="No readings recorded for this sensor")
+    return summary
+
 @app.put("/sensors/{sensor_id}", response_model=schemas.Sensor)
 def update_sensor(sensor_id: int, sensor_update: schemas.SensorCreate, db: Session = Depends(get_db)):
-    sensor = crud.get_sensor(db, sensor_id=sensor_id)
+    sensor = crud.update_sensor(db, sensor_id, sensor_update)
     if not sensor:
         raise HTTPException(status_code=404, detail="Sensor not found")
-    sensor.type = sensor_update.type
-    sensor.location = sensor_update.location
-    sensor.status = sensor_update.status
-    db.commit()
-    db.refresh(sensor)
     return sensor
 
 @app.delete("/sensors/{sensor_id}")
 def delete_sensor(sensor_id: int, db: Session = Depends(get_db)):
-    sensor = crud.get_sensor(db, sensor_id=sensor_id)
-    if not sensor:
+    if not crud.delete_sensor(db, sensor_id):
         raise HTTPException(status_code=404, detail="Sensor not found")
-    db.delete(sensor)
-    db.commit()
+    latest_cache.forget(sensor_id)
+    anomalies.invalidate(sensor_id)
     return {"message": "Sensor deleted successfully"}
 
 
 # ----- SENSOR DATA -----
 
-@app.post("/sensor-data/", response_model=schemas.SensorData)
-def create_sensor_data(sensor_data: schemas.SensorDataCreate, db: Session = Depends(get_db)):
-    return crud.create_sensor_data(db=db, sensor_data=sensor_data)
+def queue_sensor_data(sensor_data: schemas.SensorDataCreate, response: Response):
+    # Write-behind ingest shared by the sync and async POST /sensor-data/; blocks until the
+    # reading is committed unless WRITE_BEHIND_DURABILITY is "enqueue".
+    try:
+        pending = write_behind.sensor_data_queue.submit(sensor_data.model_dump())
+    except write_behind.QueueFull:
+        raise HTTPException(status_code=503, detail="Sensor data queue is full, retry later")
+    if config.WRITE_BEHIND_DURABILITY == "enqueue":
+        response.status_code = status.HTTP_202_ACCEPTED
+        return schemas.SensorDataQueued(status="queued", queue_depth=write_behind.sensor_data_queue.depth())
+    try:
+        return pending.wait(config.WRITE_BEHIND_ACK_TIMEOUT_S)
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="Sensor data was not committed in time")
+
+@app.post("/sensor-data/", response_model=schemas.SensorData | schemas.SensorDataQueued)
+def create_sensor_data(sensor_data: schemas.SensorDataCreate, response: Response, db: Session = Depends(get_db)):
+    if config.SENSOR_DATA_INGEST_MODE != "write_behind":
+        return crud.create_sensor_data(db=db, sensor_data=sensor_data)
+    return queue_sensor_data(sensor_data, response)
+
+MAX_SENSOR_DATA_BATCH = 5000
+
+@app.post("/sensor-data/batch", response_model=schemas.SensorDataBatchResult)
+def create_sensor_data_batch(readings: list[dict] = Body(...), db: Session = Depends(get_db)):
+    if len(readings) > MAX_SENSOR_DATA_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_SENSOR_DATA_BATCH} readings")
+    valid, errors = schemas.validate_sensor_data_batch(readings)
+    inserted = crud.create_sensor_data_batch(db, [reading for _, reading in valid])
+    return sensor_data_batch_result(readings, valid, errors, inserted)
+
+def sensor_data_batch_result(readings, valid, errors, inserted):
+    for (index, _), row in zip(valid, inserted):
+        if row is None:
+            errors[index] = ["Sensor not found"]
+    created = {index: row.data_id for (index, _), row in zip(valid, inserted) if row is not None}
+    results = [
+        schemas.SensorDataBatchItemResult(index=index, status="created", data_id=created[index])
+        if index in created else
+        schemas.SensorDataBatchItemResult(index=index, status="rejected", errors=errors[index])
+        for index in range(len(readings))
+    ]
+    return schemas.SensorDataBatchResult(
+        received=len(readings), created=len(created), rejected=len(readings) - len(created), results=results
+    )
+
+def sensor_data_page(rows: list, response: Response):
+    if fast_json.enabled():
+        return fast_json.list_response(rows, schemas.SensorData, headers=response.headers)
+    return rows
 
 @app.get("/sensor-data/", response_model=list[schemas.SensorData])
-def get_all_sensor_data(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_all_sensor_data(db, skip=skip, limit=limit)
+def get_all_sensor_data(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_all_sensor_data(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "data_id")
+    return sensor_data_page(rows, response)
+
+@app.get("/sensor-data/rollups", response_model=list[schemas.SensorDataRollup])
+def read_sensor_data_rollups(start: datetime, end: datetime, sensor_id: int | None = None, resolution: schemas.RollupResolution | None = None, max_points: int = 1000, db: Session = Depends(get_db)):
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if resolution is None:
+        resolution = rollups.pick_resolution(start, end, max_points)
+    return rollups.get_rollups(db, models.RollupResolution(resolution), start, end, sensor_id=sensor_id)
+
+@app.get("/sensor-data/aggregate", response_model=list[schemas.AggregateBucket])
+def aggregate_sensor_data(start: datetime, end: datetime, bucket: str = "1h", metrics: list[str] = Query(list(aggregation.SENSOR_METRICS)), functions: list[str] = Query(["avg"]), sensor_id: int | None = None, per_sensor: bool = False, db: Session = Depends(get_db)):
+    return aggregation.aggregate_sensor_data(db, bucket, start, end, metrics, functions, sensor_id=sensor_id, per_sensor=per_sensor)
+
+@app.get("/sensor-data/export")
+def export_sensor_data(format: str = export.DEFAULT_FORMAT, start: datetime | None = None, end: datetime | None = None, sensor_id: int | None = None, chunk_size: int = Query(export.DEFAULT_CHUNK_SIZE, gt=0, le=export.MAX_CHUNK_SIZE), db: Session = Depends(get_db)):
+    export.check_format(format)
+    media_type, extension = export.FORMATS[format]
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    # Anything that can fail is resolved here, while an error can still become a status code.
+    tables = partitions.tables_for_range(db, start, end)
+    return StreamingResponse(
+        export.stream_export_in_session(format, start=start, end=end, sensor_id=sensor_id, chunk_size=chunk_size, tables=tables),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="sensor_data.{extension}"'},
+    )
+
+@app.get("/sensor-data/stream")
+async def stream_sensor_data(sensor_id: list[int] | None = Query(None)):
+    try:
+        subscription = live.sensor_data_broadcaster.subscribe(sensor_id)
+    except live.TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers, retry later")
+    return StreamingResponse(
+        live.sensor_data_broadcaster.events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/sensor-data/{data_id}", response_model=schemas.SensorData)
 def get_sensor_data_by_id(data_id: int, db: Session = Depends(get_db)):
@@ -145,8 +288,18 @@ def get_sensor_data_by_id(data_id: int, db: Session = Depends(get_db)):
     return data
 
 @app.get("/sensor-data/by-sensor/{sensor_id}", response_model=list[schemas.SensorData])
-def get_data_by_sensor(sensor_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_sensor_data_by_sensor(db, sensor_id=sensor_id, skip=skip, limit=limit)
+def get_data_by_sensor(response: Response, sensor_id: int, start: datetime | None = None, end: datetime | None = None, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_sensor_data_by_sensor(db, sensor_id=sensor_id, start=start, end=end, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "timestamp", "data_id")
+    return sensor_data_page(rows, response)
+
+@app.delete("/sensor-data/by-sensor/{sensor_id}", response_model=schemas.BulkOperationResult)
+def delete_data_by_sensor(sensor_id: int, start: datetime, end: datetime, dry_run: bool = False, db: Session = Depends(get_db)):
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    affected = crud.delete_sensor_data_range(db, sensor_id, start, end, dry_run=dry_run)
+    return schemas.BulkOperationResult(affected=affected, dry_run=dry_run)
 
 @app.put("/sensor-data/{data_id}", response_model=schemas.SensorData)
 def update_sensor_data(data_id: int, sensor_data: schemas.SensorDataCreate, db: Session = Depends(get_db)):
@@ -168,20 +321,29 @@ def delete_sensor_data(data_id: int, db: Session = Depends(get_db)):
 def create_irrigation_system(irrigation: schemas.IrrigationSystemCreate, db: Session = Depends(get_db)):
     return crud.create_irrigation_system(db=db, irrigation=irrigation)
 
-@app.get("/irrigation-systems/", response_model=list[schemas.IrrigationSystem])
-def read_irrigation_systems(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_irrigation_systems(db, skip=skip, limit=limit)
+@app.get("/irrigation-systems/", response_model=list[schemas.IrrigationSystem], dependencies=[Depends(versions.conditional(models.IrrigationSystem))])
+def read_irrigation_systems(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_irrigation_systems(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "irrigation_id")
+    return rows
 
-@app.get("/irrigation-systems/{irrigation_id}", response_model=schemas.IrrigationSystem)
+@app.get("/irrigation-systems/{irrigation_id}", response_model=schemas.IrrigationSystem, dependencies=[Depends(versions.conditional(models.IrrigationSystem))])
 def read_irrigation_system(irrigation_id: int, db: Session = Depends(get_db)):
     irrigation = crud.get_irrigation_system(db, irrigation_id=irrigation_id)
     if not irrigation:
         raise HTTPException(status_code=404, detail="Irrigation system not found")
     return irrigation
 
-@app.get("/irrigation-systems/by-farm/{farm_id}", response_model=list[schemas.IrrigationSystem])
-def read_irrigation_systems_by_farm(farm_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_irrigation_systems_by_farm(db, farm_id=farm_id, skip=skip, limit=limit)
+@app.get("/irrigation-systems/by-farm/{farm_id}", response_model=list[schemas.IrrigationSystem], dependencies=[Depends(versions.conditional(models.IrrigationSystem))])
+def read_irrigation_systems_by_farm(response: Response, farm_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_irrigation_systems_by_farm(db, farm_id=farm_id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "irrigation_id")
+    return rows
+
+@app.put("/irrigation-systems/by-farm/{farm_id}/status", response_model=schemas.BulkOperationResult)
+def set_irrigation_status_by_farm(farm_id: int, status_update: schemas.IrrigationStatusUpdate, dry_run: bool = False, db: Session = Depends(get_db)):
+    affected = crud.set_irrigation_status_by_farm(db, farm_id, status_update.status, dry_run=dry_run)
+    return schemas.BulkOperationResult(affected=affected, dry_run=dry_run)
 
 @app.put("/irrigation-systems/{irrigation_id}", response_model=schemas.IrrigationSystem)
 def update_irrigation_system(irrigation_id: int, irrigation_update: schemas.IrrigationSystemCreate, db: Session = Depends(get_db)):
@@ -192,8 +354,7 @@ def update_irrigation_system(irrigation_id: int, irrigation_update: schemas.Irri
 
 @app.delete("/irrigation-systems/{irrigation_id}")
 def delete_irrigation_system(irrigation_id: int, db: Session = Depends(get_db)):
-    irrigation = crud.delete_irrigation_system(db, irrigation_id=irrigation_id)
-    if not irrigation:
+    if not crud.delete_irrigation_system(db, irrigation_id=irrigation_id):
         raise HTTPException(status_code=404, detail="Irrigation system not found")
     return {"message": "Irrigation system deleted successfully"}
 
@@ -204,8 +365,14 @@ def create_weather_data(weather: schemas.WeatherDataCreate, db: Session = Depend
     return crud.create_weather_data(db=db, weather=weather)
 
 @app.get("/weather-data/", response_model=list[schemas.WeatherData])
-def read_weather_data(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_weather_data_list(db, skip=skip, limit=limit)
+def read_weather_data(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_weather_data_list(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "weather_id")
+    return rows
+
+@app.get("/weather-data/aggregate", response_model=list[schemas.AggregateBucket])
+def aggregate_weather_data(start: datetime, end: datetime, bucket: str = "1h", metrics: list[str] = Query(list(aggregation.WEATHER_METRICS)), functions: list[str] = Query(["avg"]), db: Session = Depends(get_db)):
+    return aggregation.aggregate_weather_data(db, bucket, start, end, metrics, functions)
 
 @app.get("/weather-data/{weather_id}", response_model=schemas.WeatherData)
 def read_weather_data_by_id(weather_id: int, db: Session = Depends(get_db)):
@@ -223,8 +390,7 @@ def update_weather_data(weather_id: int, weather_update: schemas.WeatherDataCrea
 
 @app.delete("/weather-data/{weather_id}")
 def delete_weather_data(weather_id: int, db: Session = Depends(get_db)):
-    weather = crud.delete_weather_data(db, weather_id=weather_id)
-    if not weather:
+    if not crud.delete_weather_data(db, weather_id=weather_id):
         raise HTTPException(status_code=404, detail="Weather data not found")
     return {"message": "Weather data deleted successfully"}
 
@@ -234,11 +400,13 @@ def delete_weather_data(weather_id: int, db: Session = Depends(get_db)):
 def create_crop(crop: schemas.CropManagementCreate, db: Session = Depends(get_db)):
     return crud.create_crop(db=db, crop=crop)
 
-@app.get("/crops/", response_model=list[schemas.CropManagement])
-def read_crops(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_crops(db, skip=skip, limit=limit)
+@app.get("/crops/", response_model=list[schemas.CropManagement], dependencies=[Depends(versions.conditional(models.CropManagement))])
+def read_crops(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_crops(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "crop_id")
+    return rows
 
-@app.get("/crops/{crop_id}", response_model=schemas.CropManagement)
+@app.get("/crops/{crop_id}", response_model=schemas.CropManagement, dependencies=[Depends(versions.conditional(models.CropManagement))])
 def read_crop(crop_id: int, db: Session = Depends(get_db)):
     crop = crud.get_crop(db, crop_id=crop_id)
     if not crop:
@@ -254,8 +422,7 @@ def update_crop(crop_id: int, crop_update: schemas.CropManagementCreate, db: Ses
 
 @app.delete("/crops/{crop_id}")
 def delete_crop(crop_id: int, db: Session = Depends(get_db)):
-    crop = crud.delete_crop(db, crop_id=crop_id)
-    if not crop:
+    if not crud.delete_crop(db, crop_id=crop_id):
         raise HTTPException(status_code=404, detail="Crop not found")
     return {"message": "Crop deleted successfully"}
 
@@ -266,8 +433,10 @@ def create_fertilization_system(fertilization: schemas.FertilizationSystemCreate
     return crud.create_fertilization_system(db=db, fertilization=fertilization)
 
 @app.get("/fertilization-systems/", response_model=list[schemas.FertilizationSystem])
-def read_fertilization_systems(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_fertilization_systems(db, skip=skip, limit=limit)
+def read_fertilization_systems(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_fertilization_systems(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "fertilization_id")
+    return rows
 
 @app.get("/fertilization-systems/{fertilization_id}", response_model=schemas.FertilizationSystem)
 def read_fertilization_system(fertilization_id: int, db: Session = Depends(get_db)):
@@ -277,8 +446,10 @@ def read_fertilization_system(fertilization_id: int, db: Session = Depends(get_d
     return fertilization
 
 @app.get("/fertilization-systems/by-farm/{farm_id}", response_model=list[schemas.FertilizationSystem])
-def read_fertilization_systems_by_farm(farm_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_fertilization_systems_by_farm(db, farm_id=farm_id, skip=skip, limit=limit)
+def read_fertilization_systems_by_farm(response: Response, farm_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_fertilization_systems_by_farm(db, farm_id=farm_id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "fertilization_id")
+    return rows
 
 @app.put("/fertilization-systems/{fertilization_id}", response_model=schemas.FertilizationSystem)
 def update_fertilization_system(fertilization_id: int, fertilization_update: schemas.FertilizationSystemCreate, db: Session = Depends(get_db)):
@@ -289,8 +460,7 @@ def update_fertilization_system(fertilization_id: int, fertilization_update: sch
 
 @app.delete("/fertilization-systems/{fertilization_id}")
 def delete_fertilization_system(fertilization_id: int, db: Session = Depends(get_db)):
-    fertilization = crud.delete_fertilization_system(db, fertilization_id=fertilization_id)
-    if not fertilization:
+    if not crud.delete_fertilization_system(db, fertilization_id=fertilization_id):
         raise HTTPException(status_code=404, detail="Fertilization system not found")
     return {"message": "Fertilization system deleted successfully"}
 
@@ -301,8 +471,10 @@ def create_pest_disease_detection(detection: schemas.PestDiseaseDetectionCreate,
     return crud.create_pest_disease_detection(db=db, detection=detection)
 
 @app.get("/pest-disease-detections/", response_model=list[schemas.PestDiseaseDetection])
-def read_pest_disease_detections(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_pest_disease_detections(db, skip=skip, limit=limit)
+def read_pest_disease_detections(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_pest_disease_detections(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "detection_id")
+    return rows
 
 @app.get("/pest-disease-detections/{detection_id}", response_model=schemas.PestDiseaseDetection)
 def read_pest_disease_detection(detection_id: int, db: Session = Depends(get_db)):
@@ -312,8 +484,15 @@ def read_pest_disease_detection(detection_id: int, db: Session = Depends(get_db)
     return detection
 
 @app.get("/pest-disease-detections/by-crop/{crop_id}", response_model=list[schemas.PestDiseaseDetection])
-def read_pest_disease_detections_by_crop(crop_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_pest_disease_detections_by_crop(db, crop_id=crop_id, skip=skip, limit=limit)
+def read_pest_disease_detections_by_crop(response: Response, crop_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_pest_disease_detections_by_crop(db, crop_id=crop_id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "detection_id")
+    return rows
+
+@app.delete("/pest-disease-detections/by-crop/{crop_id}", response_model=schemas.BulkOperationResult)
+def delete_pest_disease_detections_by_crop(crop_id: int, dry_run: bool = False, db: Session = Depends(get_db)):
+    affected = crud.delete_pest_disease_detections_by_crop(db, crop_id, dry_run=dry_run)
+    return schemas.BulkOperationResult(affected=affected, dry_run=dry_run)
 
 @app.put("/pest-disease-detections/{detection_id}", response_model=schemas.PestDiseaseDetection)
 def update_pest_disease_detection(detection_id: int, detection_update: schemas.PestDiseaseDetectionCreate, db: Session = Depends(get_db)):
@@ -324,8 +503,7 @@ def update_pest_disease_detection(detection_id: int, detection_update: schemas.P
 
 @app.delete("/pest-disease-detections/{detection_id}")
 def delete_pest_disease_detection(detection_id: int, db: Session = Depends(get_db)):
-    detection = crud.delete_pest_disease_detection(db, detection_id=detection_id)
-    if not detection:
+    if not crud.delete_pest_disease_detection(db, detection_id=detection_id):
         raise HTTPException(status_code=404, detail="Pest & disease detection not found")
     return {"message": "Pest & disease detection deleted successfully"}
 
@@ -336,8 +514,10 @@ def create_supply_chain_transaction(transaction: schemas.SupplyChainTransactionC
     return crud.create_supply_chain_transaction(db=db, transaction=transaction)
 
 @app.get("/supply-chain-transactions/", response_model=list[schemas.SupplyChainTransaction])
-def read_supply_chain_transactions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_supply_chain_transactions(db, skip=skip, limit=limit)
+def read_supply_chain_transactions(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_supply_chain_transactions(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "transaction_id")
+    return rows
 
 @app.get("/supply-chain-transactions/{transaction_id}", response_model=schemas.SupplyChainTransaction)
 def read_supply_chain_transaction(transaction_id: int, db: Session = Depends(get_db)):
@@ -347,8 +527,10 @@ def read_supply_chain_transaction(transaction_id: int, db: Session = Depends(get
     return transaction
 
 @app.get("/supply-chain-transactions/by-crop/{crop_id}", response_model=list[schemas.SupplyChainTransaction])
-def read_supply_chain_transactions_by_crop(crop_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_supply_chain_transactions_by_crop(db, crop_id=crop_id, skip=skip, limit=limit)
+def read_supply_chain_transactions_by_crop(response: Response, crop_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    rows = crud.get_supply_chain_transactions_by_crop(db, crop_id=crop_id, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "transaction_id")
+    return rows
 
 @app.put("/supply-chain-transactions/{transaction_id}", response_model=schemas.SupplyChainTransaction)
 def update_supply_chain_transaction(transaction_id: int, transaction_update: schemas.SupplyChainTransactionCreate, db: Session = Depends(get_db)):
@@ -359,8 +541,7 @@ def update_supply_chain_transaction(transaction_id: int, transaction_update: sch
 
 @app.delete("/supply-chain-transactions/{transaction_id}")
 def delete_supply_chain_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    transaction = crud.delete_supply_chain_transaction(db, transaction_id=transaction_id)
-    if not transaction:
+    if not crud.delete_supply_chain_transaction(db, transaction_id=transaction_id):
         raise HTTPException(status_code=404, detail="Supply chain transaction not found")
     return {"message": "Supply chain transaction deleted successfully"}
 
@@ -368,21 +549,19 @@ SECRET_KEY = "your_secret_key_here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def authenticate_user(db, email: str, password: str):
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if not user:
+async def authenticate_user(db: Session, email: str, password: str):
+    # Only the quick lookups borrow a request thread; bcrypt runs on the password pool.
+    user = await run_in_threadpool(crud.get_user_by_email, db, email)
+    if not user or not user.hashed_password:
         return None
-    if not verify_password(password, user.hashed_password):
+    matches, new_hash = await passwords.verify_password_async(password, user.hashed_password)
+    if not matches:
         return None
+    if new_hash:
+        # Stored with an outdated bcrypt cost; upgrade it now that the password is known
+        await run_in_threadpool(crud.update_password_hash, db, user.user_id, new_hash)
     return user
 
 def create_access_token(data: dict, expires_delta=None):
@@ -398,8 +577,8 @@ from fastapi import Security
 from fastapi import HTTPException, Depends
 
 @app.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -422,7 +601,81 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == email).first()
+    principal = principals.get(email)
+    if principal is not None:
+        return principal
+    user = crud.get_user_by_email(db, email)
     if user is None:
         raise credentials_exception
-    return user
+    return principals.put(email, user)
+
+
+# ----- ASYNC ROUTES -----
+# With ASYNC_DB on, the hot routes below replace their sync twins in place (same path, same
+# match order) and await the async engine instead of holding a threadpool worker per request.
+
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud_async
+from database import get_async_db
+
+async_router = APIRouter()
+
+@async_router.post("/sensor-data/", response_model=schemas.SensorData | schemas.SensorDataQueued)
+async def create_sensor_data_async(sensor_data: schemas.SensorDataCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
+    if config.SENSOR_DATA_INGEST_MODE != "write_behind":
+        return await crud_async.create_sensor_data(db, sensor_data)
+    return await run_in_threadpool(queue_sensor_data, sensor_data, response)
+
+@async_router.post("/sensor-data/batch", response_model=schemas.SensorDataBatchResult)
+async def create_sensor_data_batch_async(readings: list[dict] = Body(...), db: AsyncSession = Depends(get_async_db)):
+    if len(readings) > MAX_SENSOR_DATA_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_SENSOR_DATA_BATCH} readings")
+    valid, errors = schemas.validate_sensor_data_batch(readings)
+    inserted = await crud_async.create_sensor_data_batch(db, [reading for _, reading in valid])
+    return sensor_data_batch_result(readings, valid, errors, inserted)
+
+@async_router.get("/sensor-data/", response_model=list[schemas.SensorData])
+async def get_all_sensor_data_async(response: Response, skip: int = 0, limit: int = 100, cursor: str | None = None, db: AsyncSession = Depends(get_async_db)):
+    rows = await crud_async.get_all_sensor_data(db, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "data_id")
+    return sensor_data_page(rows, response)
+
+@async_router.get("/sensor-data/{data_id}", response_model=schemas.SensorData)
+async def get_sensor_data_by_id_async(data_id: int, db: AsyncSession = Depends(get_async_db)):
+    data = await crud_async.get_sensor_data(db, data_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Sensor data not found")
+    return data
+
+@async_router.get("/sensor-data/by-sensor/{sensor_id}", response_model=list[schemas.SensorData])
+async def get_data_by_sensor_async(response: Response, sensor_id: int, start: datetime | None = None, end: datetime | None = None, skip: int = 0, limit: int = 100, cursor: str | None = None, db: AsyncSession = Depends(get_async_db)):
+    rows = await crud_async.get_sensor_data_by_sensor(db, sensor_id, start=start, end=end, skip=skip, limit=limit, cursor=cursor)
+    pagination.set_next_cursor(response, rows, limit, "timestamp", "data_id")
+    return sensor_data_page(rows, response)
+
+@async_router.post("/login", response_model=schemas.Token)
+async def login_async(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await crud_async.get_user_by_email(db, form_data.username)
+    matches, new_hash = (False, None)
+    if user and user.hashed_password:
+        matches, new_hash = await passwords.verify_password_async(form_data.password, user.hashed_password)
+    if not matches:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if new_hash:
+        await crud_async.update_password_hash(db, user.user_id, new_hash)
+    access_token = create_access_token(data={"sub": user.email})
+    return {"access_token": access_token, "token_type": "bearer"}
+
+def use_async_routes(router: APIRouter):
+    for async_route in router.routes:
+        for index, route in enumerate(app.router.routes):
+            if getattr(route, "path", None) == async_route.path and getattr(route, "methods", None) == async_route.methods:
+                app.router.routes[index] = async_route
+                break
+
+if config.ASYNC_DB:
+    use_async_routes(async_router)
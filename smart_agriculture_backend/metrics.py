@@ -0,0 +1,45 @@
+import threading
+from collections import deque
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+HISTOGRAM_SAMPLES = 1024
+
+def inc(name: str, value: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+def observe(name: str, value: float):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = {"count": 0, "sum": 0.0, "max": value, "samples": deque(maxlen=HISTOGRAM_SAMPLES)}
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+        histogram["samples"].append(value)
+
+def _percentile(ordered: list, fraction: float):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def snapshot():
+    with _lock:
+        histograms = {}
+        for name, histogram in _histograms.items():
+            ordered = sorted(histogram["samples"])
+            histograms[name] = {
+                "count": histogram["count"],
+                "avg": histogram["sum"] / histogram["count"],
+                "max": histogram["max"],
+                "p50": _percentile(ordered, 0.50),
+                "p95": _percentile(ordered, 0.95),
+                "p99": _percentile(ordered, 0.99),
+            }
+        return {"counters": dict(_counters), "gauges": dict(_gauges), "histograms": histograms}
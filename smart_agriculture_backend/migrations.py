@@ -0,0 +1,164 @@
+import argparse
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import delete, inspect, not_, select, text
+from sqlalchemy.orm import Session
+
+import config
+import models
+import schemas
+import versions  # bumps table versions on commit
+from database import SessionLocal, init_db
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Migration:
+    version: str
+    name: str
+    run: Callable
+
+MIGRATIONS = []
+
+def migration(version: str, name: str):
+    def register(run):
+        MIGRATIONS.append(Migration(version, name, run))
+        return run
+    return register
+
+class Progress:
+    # Checkpoint and throughput for one step. chunk_done() commits the step's own work together
+    # with its checkpoint, so an interrupted run resumes right after the last committed chunk.
+    def __init__(self, db: Session, record: models.SchemaMigration, chunk_size: int):
+        self.db = db
+        self.record = record
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    @property
+    def last_key(self):
+        return self.record.last_key
+
+    def chunk_done(self, rows: int, last_key=None):
+        if last_key is not None:
+            self.record.last_key = last_key
+        self.record.rows_processed += rows
+        self.db.commit()
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.last_report >= config.MIGRATION_PROGRESS_INTERVAL_S:
+            self.last_report = now
+            self.report()
+
+    def report(self, done: bool = False):
+        elapsed = time.perf_counter() - self.started
+        logger.info(
+            "%s %s: %s%d rows (%d in total) in %.1f s, %.0f rows/s",
+            self.record.version, self.record.name, "finished, " if done else "", self.rows,
+            self.record.rows_processed, elapsed, self.rows / elapsed if elapsed else 0.0,
+        )
+
+def process_in_chunks(db: Session, progress: Progress, pk, predicate, apply):
+    # Walks the rows matching `predicate` in primary-key order, chunk_size keys at a time.
+    # The predicate runs in SQL; apply(db, keys) gets one chunk and returns the rows it changed.
+    while True:
+        keys = select(pk).where(predicate).order_by(pk).limit(progress.chunk_size)
+        if progress.last_key is not None:
+            keys = keys.where(pk > progress.last_key)
+        chunk = db.scalars(keys).all()
+        if not chunk:
+            return
+        progress.chunk_done(apply(db, chunk), last_key=chunk[-1])
+
+def _record(db: Session, step: Migration) -> models.SchemaMigration:
+    record = db.get(models.SchemaMigration, step.version)
+    if record is None:
+        record = models.SchemaMigration(version=step.version, name=step.name, status="running", rows_processed=0)
+        db.add(record)
+        db.commit()
+    else:
+        logger.info("Resuming %s %s after key %s (%d rows done)", step.version, step.name, record.last_key, record.rows_processed)
+    return record
+
+def migrate(db: Session, chunk_size: int | None = None) -> list[str]:
+    applied = []
+    for step in sorted(MIGRATIONS, key=lambda step: step.version):
+        record = db.get(models.SchemaMigration, step.version)
+        if record is not None and record.status == "applied":
+            continue
+        record = _record(db, step)
+        progress = Progress(db, record, chunk_size or config.MIGRATION_CHUNK_SIZE)
+        step.run(db, progress)
+        record.status = "applied"
+        record.finished_at = datetime.utcnow()
+        db.commit()
+        progress.report(done=True)
+        applied.append(step.version)
+    return applied
+
+# ----- STEPS -----
+
+@migration("0001", "add columns missing from existing tables")
+def add_missing_columns(db: Session, progress: Progress):
+    # create_all() never alters an existing table, so files that predate a column are patched
+    # in place rather than dropped. Added columns are nullable: existing rows have no value.
+    dialect = db.get_bind().dialect
+    inspector = inspect(db.connection())
+    missing = [
+        (table, column)
+        for table in models.Base.metadata.sorted_tables if inspector.has_table(table.name)
+        for existing in [{column["name"] for column in inspector.get_columns(table.name)}]
+        for column in table.columns if column.name not in existing
+    ]
+    for table, column in missing:
+        db.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}"))
+        logger.info("Added %s.%s", table.name, column.name)
+        progress.chunk_done(1)
+
+@migration("0002", "delete sensors with invalid locations")
+def delete_invalid_sensor_locations(db: Session, progress: Progress):
+    # Sensors that fail schemas.LOCATION_PATTERN cannot be serialised by the API.
+    sensor = models.Sensor
+    invalid = not_(sensor.location.regexp_match(schemas.LOCATION_PATTERN))
+    process_in_chunks(
+        db, progress, sensor.sensor_id, invalid,
+        lambda db, keys: db.execute(delete(sensor).where(sensor.sensor_id.in_(keys))).rowcount,
+    )
+
+@migration("0003", "drop the duplicate users email index")
+def drop_duplicate_email_index(db: Session, progress: Progress):
+    # Files whose users table already had UNIQUE(email) were given a second index,
+    # ix_users_email, for a while. Where it is the only one enforcing uniqueness it stays.
+    inspector = inspect(db.connection())
+    if not inspector.has_table("users"):
+        return
+    indexes = {index["name"] for index in inspector.get_indexes("users")}
+    unique = any(constraint["column_names"] == ["email"] for constraint in inspector.get_unique_constraints("users"))
+    if "ix_users_email" in indexes and unique:
+        db.execute(text("DROP INDEX ix_users_email"))
+        logger.info("Dropped ix_users_email")
+        progress.chunk_done(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned schema and data-repair migrations")
+    parser.add_argument("command", choices=["up", "status"])
+    parser.add_argument("--chunk-size", type=int, help=f"rows per committed batch (default: {config.MIGRATION_CHUNK_SIZE})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    with SessionLocal() as db:
+        if args.command == "up":
+            applied = migrate(db, chunk_size=args.chunk_size)
+            print(f"Applied {', '.join(applied)}" if applied else "Nothing to apply")
+        else:
+            records = {record.version: record for record in db.scalars(select(models.SchemaMigration))}
+            for step in sorted(MIGRATIONS, key=lambda step: step.version):
+                record = records.get(step.version)
+                state = f"{record.status}, {record.rows_processed} rows" if record else "pending"
+                print(f"{step.version} {step.name}: {state}")
@@ -1,8 +1,29 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, TIMESTAMP, ForeignKey
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Float, Enum, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.sql import func
 from database import Base
 import enum
 
+class _SQLiteTimestamp(sqlite.DATETIME):
+    # Bind in the same text form as CURRENT_TIMESTAMP so range and cursor
+    # comparisons against server-defaulted rows order correctly.
+    def bind_processor(self, dialect):
+        def process(value):
+            if isinstance(value, datetime):
+                value = naive_utc(value)
+                return value.isoformat(" ", "microseconds" if value.microsecond else "seconds")
+            return value
+        return process
+
+TIMESTAMP = TIMESTAMP().with_variant(_SQLiteTimestamp(), "sqlite")
+
+def naive_utc(value: datetime | None) -> datetime | None:
+    # Timestamps are stored as naive UTC; aware values from clients are converted to match.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 class UserRole(str, enum.Enum):
     farmer = "farmer"
     admin = "admin"
@@ -49,6 +70,99 @@ class SensorData(Base):
     ph_level = Column(Float)
     timestamp = Column(TIMESTAMP, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_sensor_data_sensor_id_timestamp", "sensor_id", "timestamp"),
+        # data_id must never be reused once older readings have moved to partition tables
+        {"sqlite_autoincrement": True},
+    )
+
+class SensorDataPartition(Base):
+    __tablename__ = "sensor_data_partitions"
+
+    table_name = Column(String(64), primary_key=True)
+    month_start = Column(TIMESTAMP, nullable=False, unique=True)
+    month_end = Column(TIMESTAMP, nullable=False)
+    min_data_id = Column(Integer)
+    max_data_id = Column(Integer)
+    row_count = Column(Integer, nullable=False, default=0)
+
+class SensorHealth(Base):
+    # Compact per-sensor summary kept current at ingest, so fault checks never scan readings.
+    __tablename__ = "sensor_health"
+
+    sensor_id = Column(Integer, ForeignKey("sensors.sensor_id"), primary_key=True)
+    last_data_id = Column(Integer, nullable=False)
+    last_reading_at = Column(TIMESTAMP, nullable=False)
+    temperature = Column(Float)
+    humidity = Column(Float)
+    soil_moisture = Column(Float)
+    ph_level = Column(Float)
+    flat_since = Column(TIMESTAMP, nullable=False)
+    flat_count = Column(Integer, nullable=False, default=1)
+    at_limit_since = Column(TIMESTAMP)
+    at_limit_count = Column(Integer, nullable=False, default=0)
+    fault_reason = Column(String(32))
+
+class SchemaMigration(Base):
+    # One row per migration step; last_key is the checkpoint a resumed run continues after.
+    __tablename__ = "schema_migrations"
+
+    version = Column(String(32), primary_key=True)
+    name = Column(String(255), nullable=False)
+    status = Column(String(16), nullable=False)
+    last_key = Column(Integer)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    started_at = Column(TIMESTAMP, server_default=func.now())
+    finished_at = Column(TIMESTAMP)
+
+class TableVersion(Base):
+    # Change counter behind the ETags of a table's routes, bumped in the transaction that wrote to it.
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, nullable=False)
+
+class RollupResolution(str, enum.Enum):
+    minute = "minute"
+    hour = "hour"
+    day = "day"
+
+def _rollup_mean(metric):
+    def mean(self):
+        count = getattr(self, f"{metric}_count")
+        return getattr(self, f"{metric}_sum") / count if count else None
+    return property(mean)
+
+class SensorDataRollup(Base):
+    __tablename__ = "sensor_data_rollups"
+
+    resolution = Column(Enum(RollupResolution), primary_key=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.sensor_id"), primary_key=True)
+    bucket_start = Column(TIMESTAMP, primary_key=True)
+    reading_count = Column(Integer, nullable=False, default=0)
+    temperature_count = Column(Integer, nullable=False, default=0)
+    temperature_sum = Column(Float, nullable=False, default=0.0)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    humidity_count = Column(Integer, nullable=False, default=0)
+    humidity_sum = Column(Float, nullable=False, default=0.0)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+    soil_moisture_count = Column(Integer, nullable=False, default=0)
+    soil_moisture_sum = Column(Float, nullable=False, default=0.0)
+    soil_moisture_min = Column(Float)
+    soil_moisture_max = Column(Float)
+    ph_level_count = Column(Integer, nullable=False, default=0)
+    ph_level_sum = Column(Float, nullable=False, default=0.0)
+    ph_level_min = Column(Float)
+    ph_level_max = Column(Float)
+
+    temperature_mean = _rollup_mean("temperature")
+    humidity_mean = _rollup_mean("humidity")
+    soil_moisture_mean = _rollup_mean("soil_moisture")
+    ph_level_mean = _rollup_mean("ph_level")
+
 class IrrigationStatus(str, enum.Enum):
     on = "on"
     off = "off"
@@ -70,7 +184,7 @@ class WeatherData(Base):
     humidity = Column(Float, nullable=False)
     rainfall = Column(Float, nullable=False)
     wind_speed = Column(Float, nullable=False)
-    timestamp = Column(TIMESTAMP, server_default=func.now())
+    timestamp = Column(TIMESTAMP, server_default=func.now(), index=True)
 
 class CropStatus(str, enum.Enum):
     planted = "planted"
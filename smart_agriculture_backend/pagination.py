@@ -0,0 +1,77 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import literal, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class InvalidCursor(ValueError):
+    pass
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+def _decode_value(obj):
+    if "dt" in obj:
+        if not isinstance(obj["dt"], str):
+            raise ValueError("Timestamp in cursor is not a string")
+        return datetime.fromisoformat(obj["dt"])
+    return obj
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=_encode_value, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+def _matches_type(value, column) -> bool:
+    # A forged cursor must not reach the SQL comparison with a value of the wrong kind.
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return True
+    if isinstance(value, bool):
+        return expected is bool
+    if isinstance(value, int) and not _INT64_MIN <= value <= _INT64_MAX:
+        # Drivers cannot bind integers wider than 64 bits (SQLite raises OverflowError).
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw, object_hook=_decode_value)
+    except ValueError:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor("Cursor does not belong to this listing")
+    if not all(_matches_type(value, column) for value, column in zip(values, columns)):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+def keyset(query, columns: list, cursor: str | None, skip: int, limit: int):
+    # Seek past the last row of the previous page instead of counting skipped rows.
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            bound = [literal(value, column.type) for column, value in zip(columns, values)]
+            query = query.filter(tuple_(*columns) > tuple_(*bound))
+    return query.order_by(*columns).offset(skip).limit(limit)
+
+def next_cursor(rows: list, limit: int, *attrs: str) -> str | None:
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor([getattr(last, attr) for attr in attrs])
+
+def set_next_cursor(response, rows: list, limit: int, *attrs: str):
+    cursor = next_cursor(rows, limit, *attrs)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
@@ -0,0 +1,241 @@
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, insert, select, text, union_all
+from sqlalchemy.orm import Session
+
+import config
+import metrics
+import models
+import pagination
+import versions
+from database import SessionLocal, init_db
+
+logger = logging.getLogger(__name__)
+
+# Sealed months live in sensor_data_YYYYMM tables; sensor_data keeps the current month
+# plus anything not sealed yet, and remains the only table readings are inserted into.
+HOT_TABLE = models.SensorData.__table__
+
+_metadata = MetaData()
+_tables = {}
+_tables_lock = threading.Lock()
+_legacy_allocator = None
+# (version, [(table_name, month_start, month_end), ...]) as of a catalog version, oldest month first.
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def enabled() -> bool:
+    return config.SENSOR_DATA_PARTITIONING == "monthly"
+
+def month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(timestamp: datetime) -> datetime:
+    return (month_start(timestamp) + timedelta(days=32)).replace(day=1)
+
+def table_name(timestamp: datetime) -> str:
+    return f"sensor_data_{timestamp:%Y%m}"
+
+def partition_table(name: str) -> Table:
+    # Same columns as sensor_data, without the sensors foreign key: sealed rows are history.
+    with _tables_lock:
+        table = _tables.get(name)
+        if table is None:
+            columns = [
+                Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable, autoincrement=False)
+                for column in HOT_TABLE.columns
+            ]
+            table = Table(
+                name, _metadata, *columns,
+                Index(f"ix_{name}_sensor_id_timestamp", "sensor_id", "timestamp"),
+                Index(f"ix_{name}_timestamp", "timestamp"),
+            )
+            _tables[name] = table
+        return table
+
+def get_partitions(db: Session, start: datetime | None = None, end: datetime | None = None):
+    partition = models.SensorDataPartition
+    query = db.query(partition)
+    if start is not None:
+        query = query.filter(partition.month_end > start)
+    if end is not None:
+        query = query.filter(partition.month_start < end)
+    return query.order_by(partition.month_start).all()
+
+def _cached_catalog(db: Session) -> list[tuple]:
+    # Checking the catalog's version is one primary-key lookup; the catalog itself is only
+    # reloaded after a seal or drop, in this process or any other.
+    global _catalog
+    version, _ = versions.current(db, models.SensorDataPartition.__tablename__)
+    with _catalog_lock:
+        if _catalog is not None and _catalog[0] == version:
+            return _catalog[1]
+    partition = models.SensorDataPartition
+    rows = db.execute(
+        select(partition.table_name, partition.month_start, partition.month_end).order_by(partition.month_start)
+    ).all()
+    entries = [tuple(row) for row in rows]
+    with _catalog_lock:
+        _catalog = (version, entries)
+    metrics.inc("partitions.catalog_loads")
+    return entries
+
+def _invalidate_catalog():
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+def tables_for_range(db: Session, start: datetime | None = None, end: datetime | None = None) -> list[Table]:
+    # Only the months overlapping [start, end) are touched, oldest first, hot table last.
+    # With partitioning off nothing is sealed, so the catalog is not consulted at all.
+    if not enabled():
+        return [HOT_TABLE]
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    tables = [
+        partition_table(name)
+        for name, first, last in _cached_catalog(db)
+        if (start is None or last > start) and (end is None or first < end)
+    ]
+    return tables + [HOT_TABLE]
+
+def _range_filters(table: Table, start: datetime | None, end: datetime | None) -> list:
+    # Shared by union_source and keyset_union, so every caller compares in naive UTC.
+    start, end = models.naive_utc(start), models.naive_utc(end)
+    filters = []
+    if start is not None:
+        filters.append(table.c.timestamp >= start)
+    if end is not None:
+        filters.append(table.c.timestamp < end)
+    return filters
+
+def union_source(tables: list[Table], filters, start: datetime | None = None, end: datetime | None = None):
+    # filters(table) returns the WHERE clauses for one branch, so every branch can use its own indexes.
+    branches = [select(*table.c).where(*_range_filters(table, start, end), *filters(table)) for table in tables]
+    if len(branches) == 1:
+        return branches[0].subquery()
+    return union_all(*branches).subquery()
+
+def keyset_union(db: Session, tables: list[Table], filters, keys: list[str], cursor: str | None, skip: int, limit: int, start: datetime | None = None, end: datetime | None = None):
+    # Each branch seeks and stops at skip + limit rows on its own index; the outer
+    # query merges those short lists and applies the page.
+    branches = []
+    for table in tables:
+        branch = select(*table.c).where(*_range_filters(table, start, end), *filters(table))
+        branch = pagination.keyset(branch, [table.c[key] for key in keys], cursor, 0, skip + limit)
+        branches.append(select(*branch.subquery().c))
+    merged = union_all(*branches).subquery()
+    return db.execute(pagination.keyset(select(merged), [merged.c[key] for key in keys], None, skip, limit)).all()
+
+def locate(db: Session, data_id: int):
+    # Returns (table, row) for a reading wherever it currently lives, or (None, None).
+    row = db.execute(select(HOT_TABLE).where(HOT_TABLE.c.data_id == data_id)).first()
+    if row is not None:
+        return HOT_TABLE, row
+    partition = models.SensorDataPartition
+    candidates = db.query(partition).filter(partition.min_data_id <= data_id, partition.max_data_id >= data_id)
+    for candidate in candidates.order_by(partition.month_start).all():
+        table = partition_table(candidate.table_name)
+        row = db.execute(select(table).where(table.c.data_id == data_id)).first()
+        if row is not None:
+            return table, row
+    return None, None
+
+def _reuses_ids(db: Session) -> bool:
+    global _legacy_allocator
+    if _legacy_allocator is None:
+        if db.get_bind().dialect.name != "sqlite":
+            _legacy_allocator = False
+        else:
+            ddl = db.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": HOT_TABLE.name}).scalar()
+            _legacy_allocator = "AUTOINCREMENT" not in (ddl or "").upper()
+    return _legacy_allocator
+
+def keep_allocator(db: Session, table: Table) -> list:
+    # SQLite files created before sensor_data used AUTOINCREMENT derive the next data_id from
+    # the largest one left in the table, so there the newest row is never moved or purged.
+    if table is not HOT_TABLE or not _reuses_ids(db):
+        return []
+    newest = select(HOT_TABLE.c.data_id).order_by(HOT_TABLE.c.data_id.desc()).limit(1).scalar_subquery()
+    return [HOT_TABLE.c.data_id != newest]
+
+def _record(db: Session, name: str, month: datetime, rows: list):
+    partition = db.get(models.SensorDataPartition, name)
+    if partition is None:
+        partition = models.SensorDataPartition(table_name=name, month_start=month, month_end=next_month(month), row_count=0)
+        db.add(partition)
+    ids = [row.data_id for row in rows]
+    partition.min_data_id = min(ids + ([partition.min_data_id] if partition.min_data_id is not None else []))
+    partition.max_data_id = max(ids + ([partition.max_data_id] if partition.max_data_id is not None else []))
+    partition.row_count += len(rows)
+
+def seal(db: Session, before: datetime | None = None, batch_size: int | None = None) -> int:
+    # Moves readings older than `before` (default: the current month) out of the hot table.
+    # Copy, catalog update and delete commit together, so a reading is always in exactly one table.
+    before = month_start(before or datetime.utcnow())
+    batch_size = batch_size or config.PARTITION_SEAL_BATCH_SIZE
+    moved = 0
+    while True:
+        started = time.perf_counter()
+        rows = db.execute(
+            select(HOT_TABLE)
+            .where(HOT_TABLE.c.timestamp < before, *keep_allocator(db, HOT_TABLE))
+            .order_by(HOT_TABLE.c.data_id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            db.commit()
+            break
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(month_start(row.timestamp), []).append(row)
+        for month, month_rows in by_month.items():
+            name = table_name(month)
+            table = partition_table(name)
+            table.create(bind=db.connection(), checkfirst=True)
+            db.execute(insert(table), [row._asdict() for row in month_rows])
+            _record(db, name, month, month_rows)
+        db.execute(delete(HOT_TABLE).where(HOT_TABLE.c.data_id.in_([row.data_id for row in rows])))
+        db.commit()
+        _invalidate_catalog()
+        moved += len(rows)
+        metrics.observe("partitions.seal_batch_ms", (time.perf_counter() - started) * 1000)
+        if len(rows) < batch_size:
+            break
+    metrics.inc("partitions.rows_sealed", moved)
+    if moved:
+        logger.info("Sealed %d readings older than %s into monthly partitions", moved, before)
+    return moved
+
+def drop(db: Session, partition: models.SensorDataPartition):
+    # A whole month goes with one DROP TABLE instead of a row-by-row DELETE.
+    table = partition_table(partition.table_name)
+    table.drop(bind=db.connection(), checkfirst=True)
+    db.delete(partition)
+    _invalidate_catalog()
+    with _tables_lock:
+        _tables.pop(partition.table_name, None)
+        _metadata.remove(table)
+
+def run_scheduled():
+    with SessionLocal() as db:
+        seal(db)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage monthly sensor_data partitions")
+    parser.add_argument("command", choices=["seal", "list"])
+    parser.add_argument("--before", type=datetime.fromisoformat, help="seal readings before this month (default: current month)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    with SessionLocal() as db:
+        if args.command == "seal":
+            if not enabled():
+                parser.error("SENSOR_DATA_PARTITIONING is not \"monthly\"; sealed months would not be read")
+            print(f"Sealed {seal(db, before=args.before)} readings")
+        else:
+            for partition in get_partitions(db):
+                print(f"{partition.table_name}: {partition.row_count} rows, data_id {partition.min_data_id}..{partition.max_data_id}")
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+import config
+import metrics
+
+# Hashes whose cost differs from BCRYPT_ROUNDS count as needing an update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=config.BCRYPT_ROUNDS)
+
+class PasswordPoolBusy(Exception):
+    pass
+
+# bcrypt is CPU-bound; running it here keeps it off the request threadpool and the event loop.
+_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_WORKERS, thread_name_prefix="passwords")
+_slots = threading.BoundedSemaphore(config.PASSWORD_WORKERS + config.PASSWORD_QUEUE_LIMIT)
+
+def _timed(name: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        metrics.observe(f"passwords.{name}_s", time.perf_counter() - started)
+
+def _submit(name: str, fn, *args) -> Future:
+    if not _slots.acquire(blocking=False):
+        metrics.inc("passwords.rejected")
+        raise PasswordPoolBusy()
+    future = _executor.submit(_timed, name, fn, *args)
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+def hash_password(password: str) -> str:
+    return _submit("hash", pwd_context.hash, password).result()
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit("hash", pwd_context.hash, password))
+
+async def verify_password_async(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # (matches, replacement hash when the stored one uses an outdated cost or scheme)
+    return await asyncio.wrap_future(_submit("verify", pwd_context.verify_and_update, password, hashed_password))
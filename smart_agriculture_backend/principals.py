@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import metrics
+import schemas
+
+# Authenticated users keyed by token subject (email), least recently used first. Entries are
+# detached schemas.User snapshots, so a hit never touches a session or the users table.
+_principals = OrderedDict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+def _count(hit: bool):
+    global _hits, _misses
+    if hit:
+        _hits += 1
+    else:
+        _misses += 1
+    metrics.inc("principals.hits" if hit else "principals.misses")
+    metrics.set_gauge("principals.hit_ratio", _hits / (_hits + _misses))
+
+def get(subject: str) -> schemas.User | None:
+    now = time.monotonic()
+    with _lock:
+        entry = _principals.get(subject)
+        if entry is not None and entry[0] <= now:
+            del _principals[subject]
+            entry = None
+        if entry is not None:
+            _principals.move_to_end(subject)
+        _count(entry is not None)
+    return entry[1] if entry is not None else None
+
+def put(subject: str, user) -> schemas.User:
+    principal = schemas.User.model_validate(user)
+    with _lock:
+        _principals[subject] = (time.monotonic() + config.PRINCIPAL_CACHE_TTL_S, principal)
+        _principals.move_to_end(subject)
+        while len(_principals) > config.PRINCIPAL_CACHE_SIZE:
+            _principals.popitem(last=False)
+        metrics.set_gauge("principals.size", len(_principals))
+    return principal
+
+def invalidate_user(user_id: int):
+    # Called by every route that changes or removes a user. Writes are rare next to
+    # authenticated reads, so a scan beats keeping a second index by user_id.
+    with _lock:
+        for subject in [subject for subject, (_, principal) in _principals.items() if principal.user_id == user_id]:
+            del _principals[subject]
+        metrics.set_gauge("principals.size", len(_principals))
@@ -0,0 +1,62 @@
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import pagination
+
+class Repository:
+    # Get/list/create/update/delete for one model keyed by a single-column primary key.
+    # Statements are built once per repository and only ever receive new bound values,
+    # so every call after the first is a hit in the engine's compiled statement cache.
+    # Writes are one statement each: create and update hand back the Row from RETURNING,
+    # which stays readable after commit, and delete reports whether a row was removed.
+    def __init__(self, model, pk):
+        self.model = model
+        self.pk = pk
+        columns = model.__table__.columns
+        unsynced = {"synchronize_session": False}
+        self._select = select(model)
+        self._get = select(model).where(pk == bindparam("pk"))
+        self._insert = insert(model).returning(*columns)
+        self._update = update(model).where(pk == bindparam("pk")).returning(*columns).execution_options(**unsynced)
+        self._delete = delete(model).where(pk == bindparam("pk")).execution_options(**unsynced)
+
+    def get(self, db: Session, pk):
+        return db.scalars(self._get, {"pk": pk}).first()
+
+    def list(self, db: Session, *criteria, skip: int = 0, limit: int = 100, cursor: str | None = None):
+        stmt = self._select.where(*criteria) if criteria else self._select
+        return db.scalars(pagination.keyset(stmt, [self.pk], cursor, skip, limit)).all()
+
+    def create(self, db: Session, values: dict):
+        row = db.execute(self._insert, values).one()
+        db.commit()
+        return row
+
+    def update(self, db: Session, pk, values: dict):
+        # No row back means no such key; there is no read beforehand.
+        row = db.execute(self._update.values(**values), {"pk": pk}).one_or_none()
+        db.commit()
+        return row
+
+    def delete(self, db: Session, pk) -> bool:
+        deleted = db.execute(self._delete, {"pk": pk}).rowcount
+        db.commit()
+        return deleted > 0
+
+    def count(self, db: Session, *criteria) -> int:
+        return db.scalar(select(func.count()).select_from(self.model).where(*criteria))
+
+    def update_where(self, db: Session, values: dict, *criteria, dry_run: bool = False) -> int:
+        # One set-based UPDATE for every matching row; dry_run counts the same rows instead.
+        if dry_run:
+            return self.count(db, *criteria)
+        updated = db.execute(update(self.model).where(*criteria).values(**values).execution_options(synchronize_session=False)).rowcount
+        db.commit()
+        return updated
+
+    def delete_where(self, db: Session, *criteria, dry_run: bool = False) -> int:
+        if dry_run:
+            return self.count(db, *criteria)
+        deleted = db.execute(delete(self.model).where(*criteria).execution_options(synchronize_session=False)).rowcount
+        db.commit()
+        return deleted
@@ -0,0 +1,226 @@
+import argparse
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+import config
+import export
+import metrics
+import models
+import partitions
+import rollups
+from database import SessionLocal, engine, init_db
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RetentionReport:
+    cutoff: datetime
+    mode: str
+    rows_deleted: int = 0
+    rows_archived: int = 0
+    archive_files: int = 0
+    partitions_dropped: int = 0
+    transactions: int = 0
+    lock_seconds_total: float = 0.0
+    lock_seconds_max: float = 0.0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    bytes_reclaimed: int = 0
+    free_bytes_unreclaimed: int = 0
+
+    def held_lock(self, seconds: float):
+        self.transactions += 1
+        self.lock_seconds_total += seconds
+        self.lock_seconds_max = max(self.lock_seconds_max, seconds)
+        metrics.observe("retention.lock_ms", seconds * 1000)
+
+def _start_of_day(timestamp: datetime) -> datetime:
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _start_of_next_month(timestamp: datetime) -> datetime:
+    month_start = _start_of_day(timestamp).replace(day=1)
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+def _oldest_reading(db: Session, table, sensor_id: int, after: datetime | None = None):
+    # min(timestamp) for one sensor is a single seek on (sensor_id, timestamp)
+    stmt = select(func.min(table.c.timestamp)).where(table.c.sensor_id == sensor_id)
+    if after is not None:
+        stmt = stmt.where(table.c.timestamp >= after)
+    return db.scalar(stmt)
+
+def _delete_window(db: Session, table, sensor_id: int, start: datetime, end: datetime, batch_size: int, report: RetentionReport):
+    # Small committed batches so ingest only ever waits for one batch, never the whole purge.
+    batch = (
+        select(table.c.data_id)
+        .where(table.c.sensor_id == sensor_id, table.c.timestamp >= start, table.c.timestamp < end, *partitions.keep_allocator(db, table))
+        .limit(batch_size)
+    )
+    while True:
+        started = time.perf_counter()
+        deleted = db.execute(delete(table).where(table.c.data_id.in_(batch))).rowcount
+        if table is not partitions.HOT_TABLE:
+            partition = db.get(models.SensorDataPartition, table.name)
+            partition.row_count -= deleted
+        db.commit()
+        report.held_lock(time.perf_counter() - started)
+        report.rows_deleted += deleted
+        if deleted < batch_size:
+            return
+
+def archive_format() -> str:
+    return config.ARCHIVE_FORMAT or export.DEFAULT_FORMAT
+
+def _write_archive(db: Session, path: str, tables: list, **filters):
+    with open(path + ".partial", "wb") as out:
+        for data in export.stream_export(db, archive_format(), tables=tables, **filters):
+            out.write(data)
+    os.replace(path + ".partial", path)
+
+def _archive_window(db: Session, table, sensor_id: int, start: datetime, end: datetime, report: RetentionReport):
+    directory = os.path.join(config.ARCHIVE_DIR, start.strftime("%Y-%m"))
+    os.makedirs(directory, exist_ok=True)
+    _, extension = export.FORMATS[archive_format()]
+    path = os.path.join(directory, f"sensor_{sensor_id}_{start:%Y%m%d}_{end:%Y%m%d}.{extension}")
+    rows = db.scalar(
+        select(func.count()).select_from(table)
+        .where(table.c.sensor_id == sensor_id, table.c.timestamp >= start, table.c.timestamp < end)
+    )
+    _write_archive(db, path, [table], start=start, end=end, sensor_id=sensor_id)
+    report.rows_archived += rows
+    report.archive_files += 1
+
+def _purge_sensor(db: Session, table, sensor_id: int, cutoff: datetime, report: RetentionReport):
+    oldest = _oldest_reading(db, table, sensor_id)
+    while oldest is not None and oldest < cutoff:
+        start = _start_of_day(oldest)
+        if config.RETENTION_MODE == "archive":
+            end = min(_start_of_next_month(start), cutoff)
+            _archive_window(db, table, sensor_id, start, end, report)
+        else:
+            end = start + timedelta(days=1)
+            # The rollups are recomputed from the very rows about to go, so they stay exact
+            # even for readings that predate incremental maintenance. From here on they are the
+            # only record of the day; rollups.backfill never clears buckets older than the
+            # oldest raw reading, so it leaves them alone.
+            started = time.perf_counter()
+            rollups.rebuild(db, start, end, sensor_id=sensor_id)
+            db.commit()
+            report.held_lock(time.perf_counter() - started)
+        _delete_window(db, table, sensor_id, start, end, config.RETENTION_BATCH_SIZE, report)
+        oldest = _oldest_reading(db, table, sensor_id, after=end)
+
+def _drop_partition(db: Session, partition: models.SensorDataPartition, report: RetentionReport):
+    # The whole month is past the cutoff: archive or roll it up in one pass, then drop the table.
+    table = partitions.partition_table(partition.table_name)
+    if config.RETENTION_MODE == "archive":
+        directory = os.path.join(config.ARCHIVE_DIR, partition.month_start.strftime("%Y-%m"))
+        os.makedirs(directory, exist_ok=True)
+        _, extension = export.FORMATS[archive_format()]
+        _write_archive(db, os.path.join(directory, f"{partition.table_name}.{extension}"), [table])
+        report.rows_archived += partition.row_count
+        report.archive_files += 1
+    else:
+        # Same exactness guarantee as _purge_sensor, one committed day at a time, so the
+        # rebuild never holds the write lock for a whole month before the DROP.
+        day = partition.month_start
+        while day < partition.month_end:
+            started = time.perf_counter()
+            rollups.rebuild(db, day, day + timedelta(days=1))
+            db.commit()
+            report.held_lock(time.perf_counter() - started)
+            day += timedelta(days=1)
+    started = time.perf_counter()
+    report.rows_deleted += partition.row_count
+    partitions.drop(db, partition)
+    db.commit()
+    report.held_lock(time.perf_counter() - started)
+    report.partitions_dropped += 1
+
+def _sqlite_pages():
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        freelist = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    return page_size, page_count, freelist, auto_vacuum
+
+def _incremental_vacuum(report: RetentionReport):
+    page_size, page_count, freelist, auto_vacuum = _sqlite_pages()
+    if auto_vacuum != 2:
+        # Freed pages are reused by later inserts but the file cannot shrink without a full VACUUM.
+        report.free_bytes_unreclaimed = freelist * page_size
+        return
+    while freelist > 0:
+        raw = engine.raw_connection()
+        try:
+            started = time.perf_counter()
+            # executescript steps the pragma to completion; execute() would free a single page
+            raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({config.RETENTION_VACUUM_PAGES});")
+            report.held_lock(time.perf_counter() - started)
+        finally:
+            raw.close()
+        _, _, remaining, _ = _sqlite_pages()
+        if remaining >= freelist:
+            break
+        freelist = remaining
+
+def run_retention(db: Session, now: datetime | None = None) -> RetentionReport:
+    now = now or datetime.utcnow()
+    cutoff = _start_of_day(now - timedelta(days=config.RETENTION_RAW_DAYS))
+    if config.RETENTION_MODE == "archive":
+        export.check_format(archive_format())
+    report = RetentionReport(cutoff=cutoff, mode=config.RETENTION_MODE)
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite:
+        page_size, page_count, _, _ = _sqlite_pages()
+        report.bytes_before = page_size * page_count
+    for partition in partitions.get_partitions(db, end=cutoff):
+        if partition.month_end <= cutoff:
+            _drop_partition(db, partition, report)
+    # What is left past the cutoff is the unsealed part of the hot table and at most one
+    # partition straddling the cutoff, both purged row by row.
+    for table in partitions.tables_for_range(db, end=cutoff):
+        sensor_ids = db.scalars(select(table.c.sensor_id).distinct()).all()
+        for sensor_id in sensor_ids:
+            _purge_sensor(db, table, sensor_id, cutoff, report)
+    if sqlite:
+        _incremental_vacuum(report)
+        page_size, page_count, _, _ = _sqlite_pages()
+        report.bytes_after = page_size * page_count
+        report.bytes_reclaimed = report.bytes_before - report.bytes_after
+    metrics.inc("retention.rows_deleted", report.rows_deleted)
+    metrics.inc("retention.partitions_dropped", report.partitions_dropped)
+    metrics.inc("retention.bytes_reclaimed", report.bytes_reclaimed)
+    metrics.set_gauge("retention.last_lock_seconds_max", report.lock_seconds_max)
+    logger.info("Retention pass: %s", asdict(report))
+    return report
+
+def run_scheduled():
+    with SessionLocal() as db:
+        run_retention(db)
+
+def enable_incremental_vacuum():
+    # auto_vacuum can only change on an existing file through a full VACUUM
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+    finally:
+        raw.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the sensor_data retention policy once")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true", help="convert the SQLite file to auto_vacuum=INCREMENTAL first (full VACUUM)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+    with SessionLocal() as db:
+        for key, value in asdict(run_retention(db)).items():
+            print(f"{key}: {value}")
@@ -0,0 +1,185 @@
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+import models
+import partitions
+from database import SessionLocal, dialect_insert, init_db
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("temperature", "humidity", "soil_moisture", "ph_level")
+
+RESOLUTIONS = {
+    models.RollupResolution.minute: timedelta(minutes=1),
+    models.RollupResolution.hour: timedelta(hours=1),
+    models.RollupResolution.day: timedelta(days=1),
+}
+
+def bucket_start(timestamp: datetime, resolution: models.RollupResolution) -> datetime:
+    if resolution == models.RollupResolution.minute:
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == models.RollupResolution.hour:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def pick_resolution(start: datetime, end: datetime, max_points: int) -> models.RollupResolution:
+    # Finest resolution whose bucket count still fits in max_points, falling back to days.
+    for resolution, size in RESOLUTIONS.items():
+        if (end - start) / size <= max_points:
+            return resolution
+    return models.RollupResolution.day
+
+def _empty_partial(resolution, sensor_id, bucket):
+    partial = {"resolution": resolution, "sensor_id": sensor_id, "bucket_start": bucket, "reading_count": 0}
+    for metric in METRICS:
+        partial.update({f"{metric}_count": 0, f"{metric}_sum": 0.0, f"{metric}_min": None, f"{metric}_max": None})
+    return partial
+
+def _aggregate(rows) -> list[dict]:
+    partials = {}
+    for row in rows:
+        for resolution in RESOLUTIONS:
+            key = (resolution, row.sensor_id, bucket_start(row.timestamp, resolution))
+            partial = partials.get(key)
+            if partial is None:
+                partial = partials[key] = _empty_partial(*key)
+            partial["reading_count"] += 1
+            for metric in METRICS:
+                value = getattr(row, metric)
+                if value is None:
+                    continue
+                partial[f"{metric}_count"] += 1
+                partial[f"{metric}_sum"] += value
+                if partial[f"{metric}_min"] is None or value < partial[f"{metric}_min"]:
+                    partial[f"{metric}_min"] = value
+                if partial[f"{metric}_max"] is None or value > partial[f"{metric}_max"]:
+                    partial[f"{metric}_max"] = value
+    return list(partials.values())
+
+def _merge_min(current, incoming):
+    return case((current.is_(None), incoming), (incoming.is_(None), current), (incoming < current, incoming), else_=current)
+
+def _merge_max(current, incoming):
+    return case((current.is_(None), incoming), (incoming.is_(None), current), (incoming > current, incoming), else_=current)
+
+def apply_readings(db: Session, rows):
+    # Fold freshly inserted readings into every resolution within the caller's transaction.
+    partials = _aggregate(rows)
+    if not partials:
+        return
+    table = models.SensorDataRollup.__table__
+    stmt = dialect_insert(db)(table)
+    merged = {"reading_count": table.c.reading_count + stmt.excluded.reading_count}
+    for metric in METRICS:
+        merged[f"{metric}_count"] = table.c[f"{metric}_count"] + stmt.excluded[f"{metric}_count"]
+        merged[f"{metric}_sum"] = table.c[f"{metric}_sum"] + stmt.excluded[f"{metric}_sum"]
+        merged[f"{metric}_min"] = _merge_min(table.c[f"{metric}_min"], stmt.excluded[f"{metric}_min"])
+        merged[f"{metric}_max"] = _merge_max(table.c[f"{metric}_max"], stmt.excluded[f"{metric}_max"])
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.resolution, table.c.sensor_id, table.c.bucket_start], set_=merged)
+    db.execute(stmt, partials)
+
+def rebuild(db: Session, start: datetime, end: datetime, sensor_id: int | None = None, chunk_size: int = 10000):
+    # Recompute rollups from raw rows over whole days, since min/max cannot be un-applied.
+    day = models.RollupResolution.day
+    start = bucket_start(start, day)
+    if end != bucket_start(end, day):
+        end = bucket_start(end, day) + RESOLUTIONS[day]
+    rollup = models.SensorDataRollup
+    clear = delete(rollup).where(rollup.bucket_start >= start, rollup.bucket_start < end)
+    if sensor_id is not None:
+        clear = clear.where(rollup.sensor_id == sensor_id)
+    db.execute(clear)
+    for table in partitions.tables_for_range(db, start, end):
+        raw = select(*table.columns).where(table.c.timestamp >= start, table.c.timestamp < end)
+        if sensor_id is not None:
+            raw = raw.where(table.c.sensor_id == sensor_id)
+        for chunk in db.execute(raw.execution_options(yield_per=chunk_size)).partitions():
+            apply_readings(db, chunk)
+
+def rebuild_for_reading(db: Session, sensor_id: int, timestamp: datetime):
+    day = bucket_start(timestamp, models.RollupResolution.day)
+    rebuild(db, day, day + RESOLUTIONS[models.RollupResolution.day], sensor_id=sensor_id)
+
+def get_rollups(db: Session, resolution: models.RollupResolution, start: datetime, end: datetime, sensor_id: int | None = None):
+    rollup = models.SensorDataRollup
+    query = db.query(rollup).filter(
+        rollup.resolution == resolution,
+        rollup.bucket_start >= bucket_start(start, resolution),
+        rollup.bucket_start < end,
+    )
+    if sensor_id is not None:
+        query = query.filter(rollup.sensor_id == sensor_id)
+    return query.order_by(rollup.sensor_id, rollup.bucket_start).all()
+
+def _across_tables(db: Session, aggregate, pick, sensor_id: int | None):
+    # aggregate(table) over the hot table and every sealed partition, combined with pick().
+    found = []
+    for table in partitions.tables_for_range(db):
+        stmt = select(aggregate(table))
+        if sensor_id is not None:
+            stmt = stmt.where(table.c.sensor_id == sensor_id)
+        value = db.scalar(stmt)
+        if value is not None:
+            found.append(value)
+    return pick(found) if found else None
+
+def _high_water(db: Session, sensor_id: int | None):
+    return _across_tables(db, lambda table: func.max(table.c.data_id), max, sensor_id)
+
+def _oldest_raw_day(db: Session, sensor_id: int | None):
+    oldest = _across_tables(db, lambda table: func.min(table.c.timestamp), min, sensor_id)
+    return bucket_start(oldest, models.RollupResolution.day) if oldest is not None else None
+
+def backfill(db: Session, sensor_id: int | None = None, chunk_size: int = 10000):
+    # Only buckets that can be rebuilt are cleared: from the day of the oldest raw reading on.
+    # Older buckets are all that is left of days retention has purged in downsample mode,
+    # so they are kept as they are, and with no raw readings at all nothing is touched.
+    # The high-water mark is read after the clear, in the same transaction: readings above it
+    # are already folded in by the ingest path, everything at or below it is replayed here.
+    # Sealing only ever moves readings between tables, so walking data_id across all of them
+    # visits each reading once.
+    floor = _oldest_raw_day(db, sensor_id)
+    if floor is None:
+        db.rollback()
+        logger.info("No readings to rebuild rollups from; existing rollups left as they are")
+        return 0
+    rollup = models.SensorDataRollup
+    clear = delete(rollup).where(rollup.bucket_start >= floor)
+    if sensor_id is not None:
+        clear = clear.where(rollup.sensor_id == sensor_id)
+    db.execute(clear)
+    last_id = _high_water(db, sensor_id)
+    db.commit()
+    logger.info("Rebuilding rollups from %s on; older buckets kept", floor)
+
+    def filters(table):
+        window = [table.c.data_id > after, table.c.data_id <= last_id]
+        return window + ([table.c.sensor_id == sensor_id] if sensor_id is not None else [])
+
+    replayed = 0
+    after = 0
+    while True:
+        tables = partitions.tables_for_range(db)
+        chunk = partitions.keyset_union(db, tables, filters, ["data_id"], None, 0, chunk_size)
+        if not chunk:
+            break
+        apply_readings(db, chunk)
+        db.commit()
+        after = chunk[-1].data_id
+        replayed += len(chunk)
+        logger.info("Rolled up %d readings (up to data_id %d)", replayed, after)
+    return replayed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild sensor_data rollups from raw readings")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--sensor-id", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    with SessionLocal() as db:
+        print(f"Backfilled rollups from {backfill(db, sensor_id=args.sensor_id)} readings")
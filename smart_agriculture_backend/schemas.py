@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr, field_validator, constr
+from pydantic import BaseModel, EmailStr, field_validator, constr, TypeAdapter, ValidationError
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List
+from typing import Optional, List, Dict
 import re
 
 # Validation patterns
@@ -11,6 +11,14 @@ LOCATION_PATTERN = r'^[a-zA-Z\s]+$'
 BLOCKCHAIN_HASH_PATTERN = r'^[a-zA-Z0-9]{10}$'
 PEST_DISEASE_PATTERN = r'^[a-zA-Z0-9\s]{10,}$'
 
+# Physical range of each reading (None = unbounded); also used to spot sensors stuck at a limit
+SENSOR_LIMITS = {
+    'temperature': (-50, 60),
+    'humidity': (0, 100),
+    'soil_moisture': (0, None),
+    'ph_level': (0, 14),
+}
+
 class UserRole(str, Enum):
     farmer = "farmer"
     admin = "admin"
@@ -82,28 +90,32 @@ class SensorDataBase(BaseModel):
     @field_validator('temperature')
     @classmethod
     def validate_temperature(cls, v):
-        if v is not None and (v < -50 or v > 60):
+        low, high = SENSOR_LIMITS['temperature']
+        if v is not None and (v < low or v > high):
             raise ValueError("Temperature must be between -50 and 60°C")
         return v
 
     @field_validator('humidity')
     @classmethod
     def validate_humidity(cls, v):
-        if v is not None and (v < 0 or v > 100):
+        low, high = SENSOR_LIMITS['humidity']
+        if v is not None and (v < low or v > high):
             raise ValueError("Humidity must be between 0 and 100%")
         return v
 
     @field_validator('soil_moisture')
     @classmethod
     def validate_soil_moisture(cls, v):
-        if v is not None and v < 0:
+        low, _ = SENSOR_LIMITS['soil_moisture']
+        if v is not None and v < low:
             raise ValueError("Soil moisture cannot be negative")
         return v
 
     @field_validator('ph_level')
     @classmethod
     def validate_ph_level(cls, v):
-        if v is not None and (v < 0 or v > 14):
+        low, high = SENSOR_LIMITS['ph_level']
+        if v is not None and (v < low or v > high):
             raise ValueError("pH level must be between 0 and 14")
         return v
 
@@ -117,6 +129,106 @@ class SensorData(SensorDataBase):
     class Config:
         from_attributes = True
 
+class SensorDataQueued(BaseModel):
+    status: str
+    queue_depth: int
+
+class SensorDataBatchItemResult(BaseModel):
+    index: int
+    status: str
+    data_id: Optional[int] = None
+    errors: List[str] = []
+
+class SensorDataBatchResult(BaseModel):
+    received: int
+    created: int
+    rejected: int
+    results: List[SensorDataBatchItemResult]
+
+class BulkOperationResult(BaseModel):
+    affected: int
+    dry_run: bool
+
+SensorDataBatchAdapter = TypeAdapter(List[SensorDataCreate])
+
+def validate_sensor_data_batch(items: list):
+    # Validate the whole list in one pass; only on failure fall back to
+    # per-item validation to recover the readings that are still usable.
+    try:
+        return list(enumerate(SensorDataBatchAdapter.validate_python(items))), {}
+    except ValidationError as exc:
+        errors = {}
+        for error in exc.errors():
+            errors.setdefault(error["loc"][0], []).append(error["msg"])
+    valid = [
+        (index, SensorDataCreate.model_validate(item))
+        for index, item in enumerate(items)
+        if index not in errors
+    ]
+    return valid, errors
+
+class RollupResolution(str, Enum):
+    minute = "minute"
+    hour = "hour"
+    day = "day"
+
+class SensorDataRollup(BaseModel):
+    resolution: RollupResolution
+    sensor_id: int
+    bucket_start: datetime
+    reading_count: int
+    temperature_count: int
+    temperature_min: Optional[float] = None
+    temperature_max: Optional[float] = None
+    temperature_mean: Optional[float] = None
+    humidity_count: int
+    humidity_min: Optional[float] = None
+    humidity_max: Optional[float] = None
+    humidity_mean: Optional[float] = None
+    soil_moisture_count: int
+    soil_moisture_min: Optional[float] = None
+    soil_moisture_max: Optional[float] = None
+    soil_moisture_mean: Optional[float] = None
+    ph_level_count: int
+    ph_level_min: Optional[float] = None
+    ph_level_max: Optional[float] = None
+    ph_level_mean: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+class AggregateBucket(BaseModel):
+    bucket_start: datetime
+    sensor_id: Optional[int] = None
+    values: Dict[str, Optional[float]]
+
+class SensorHealth(BaseModel):
+    sensor_id: int
+    last_data_id: int
+    last_reading_at: datetime
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    soil_moisture: Optional[float] = None
+    ph_level: Optional[float] = None
+    flat_since: datetime
+    flat_count: int
+    at_limit_since: Optional[datetime] = None
+    at_limit_count: int
+    fault_reason: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class SensorAnomaly(BaseModel):
+    data_id: int
+    timestamp: datetime
+    metric: str
+    value: float
+    kinds: List[str]
+    zscore: Optional[float] = None
+    mad_score: Optional[float] = None
+    rate_per_minute: Optional[float] = None
+
 class IrrigationStatus(str, Enum):
     on = "on"
     off = "off"
@@ -143,6 +255,9 @@ class IrrigationSystemBase(BaseModel):
 class IrrigationSystemCreate(IrrigationSystemBase):
     pass
 
+class IrrigationStatusUpdate(BaseModel):
+    status: IrrigationStatus
+
 class IrrigationSystem(IrrigationSystemBase):
     irrigation_id: int
     last_activated: datetime
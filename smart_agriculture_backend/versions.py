@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import metrics
+import models
+from database import dialect_insert, get_db
+
+# Tables whose routes answer conditional GETs, plus the partition catalog that partitions caches.
+# Their version row lives in the database and is bumped in the same transaction as the write, so
+# every worker, CLI and replica agrees on it; writes to other tables skip the extra upsert. Writes
+# only count when they go through a Session in a process that has imported this module (crud,
+# migrations and partitions do); raw SQL against the file goes unseen.
+VERSIONED = frozenset(
+    model.__tablename__
+    for model in (models.Sensor, models.IrrigationSystem, models.CropManagement, models.SensorDataPartition)
+)
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_write(conn, cursor, statement, parameters, context, executemany):
+    # Statements with RETURNING report no rowcount until fetched, so they always count.
+    if not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    if cursor.rowcount == 0 and not context.compiled.effective_returning:
+        return
+    table = context.compiled.statement.table.name
+    if table in VERSIONED:
+        conn.info.setdefault("changed_tables", set()).add(table)
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def _finished(conn):
+    conn.info.pop("changed_tables", None)
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    if not session.in_transaction():
+        return
+    # Pending ORM changes are flushed after this hook, too late to be counted, so flush them now.
+    session.flush()
+    changed = session.connection().info.pop("changed_tables", None)
+    if not changed:
+        return
+    now = datetime.utcnow().replace(microsecond=0)
+    stmt = dialect_insert(session)(models.TableVersion).values(
+        [{"table_name": table, "version": 1, "updated_at": now} for table in sorted(changed)]
+    )
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["table_name"],
+        set_={"version": models.TableVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    ))
+
+def current(db: Session, table: str) -> tuple[int, datetime | None]:
+    row = db.execute(
+        select(models.TableVersion.version, models.TableVersion.updated_at).where(models.TableVersion.table_name == table)
+    ).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at.replace(tzinfo=timezone.utc)
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as RFC 9110 asks for If-None-Match.
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+def conditional(model):
+    # Route dependency: answers 304 from the table version alone, before the route's query runs,
+    # and otherwise stamps the response with the version it is about to read. The version is read
+    # first through the route's own session, so an ETag can only ever be older than its body.
+    table = model.__tablename__
+    if table not in VERSIONED:
+        raise ValueError(f"{table} is not versioned")
+
+    def check(request: Request, response: Response, db: Session = Depends(get_db)):
+        version, modified = current(db, table)
+        headers = {"ETag": f'"{table}-{version}"', "Cache-Control": "no-cache"}
+        if modified is not None:
+            headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, headers["ETag"]):
+            metrics.inc("etag.not_modified")
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return check
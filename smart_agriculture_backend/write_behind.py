@@ -0,0 +1,152 @@
+import logging
+import queue
+import threading
+import time
+
+import config
+import crud
+import metrics
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class QueueFull(Exception):
+    pass
+
+class PendingReading:
+    def __init__(self, row: dict):
+        self.row = row
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: float):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Reading was not committed in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SensorDataWriteBehind:
+    def __init__(self, session_factory, max_depth: int, flush_rows: int, flush_interval_ms: int):
+        self.session_factory = session_factory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sensor-data-write-behind", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, row: dict) -> PendingReading:
+        self.start()
+        pending = PendingReading(row)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            metrics.inc("write_behind.rejected")
+            raise QueueFull()
+        metrics.set_gauge("write_behind.queue_depth", self._queue.qsize())
+        return pending
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Drain whatever was acknowledged before shutdown was requested.
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.flush_rows):
+            self._flush(leftover[start:start + self.flush_rows])
+
+    def _insert(self, batch: list) -> list:
+        db = self.session_factory()
+        try:
+            rows = crud.insert_sensor_data_rows(db, [pending.row for pending in batch])
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            committed = list(zip(batch, self._insert(batch)))
+        except Exception as exc:
+            metrics.inc("write_behind.flush_errors")
+            if len(batch) == 1:
+                logger.exception("Write-behind reading failed: %r", batch[0].row)
+                metrics.inc("write_behind.rows_failed")
+                batch[0].resolve(error=exc)
+                return
+            # One bad reading must not take the rest of the batch down with it.
+            logger.warning("Write-behind flush of %d readings failed (%s), retrying one by one", len(batch), exc)
+            committed = []
+            for pending in batch:
+                try:
+                    committed.append((pending, self._insert([pending])[0]))
+                except Exception as row_exc:
+                    logger.exception("Write-behind reading failed: %r", pending.row)
+                    metrics.inc("write_behind.rows_failed")
+                    pending.resolve(error=row_exc)
+        crud.readings_committed([row for _, row in committed])
+        for pending, row in committed:
+            pending.resolve(result=row)
+        metrics.inc("write_behind.rows_committed", len(committed))
+        metrics.observe("write_behind.batch_size", len(batch))
+        metrics.observe("write_behind.flush_latency_ms", (time.perf_counter() - started) * 1000)
+        metrics.set_gauge("write_behind.queue_depth", self._queue.qsize())
+
+sensor_data_queue = SensorDataWriteBehind(
+    SessionLocal,
+    max_depth=config.WRITE_BEHIND_MAX_DEPTH,
+    flush_rows=config.WRITE_BEHIND_FLUSH_ROWS,
+    flush_interval_ms=config.WRITE_BEHIND_FLUSH_INTERVAL_MS,
+)
@@ -12,7 +12,17 @@ def api_request(method, endpoint, data=None, token=None):
         headers["Authorization"] = f"Bearer {token}"
     try:
         if method == "GET":
+            # Revalidate with the ETag from the last fetch; 304 means the cached body is current
+            cached = st.session_state.setdefault("etag_cache", {}).get(endpoint)
+            if cached:
+                headers["If-None-Match"] = cached[0]
             response = requests.get(f"{BACKEND_URL}{endpoint}", headers=headers)
+            if response.status_code == 304:
+                return cached[1]
+            if response.status_code == 200 and "ETag" in response.headers:
+                body = response.json()
+                st.session_state["etag_cache"][endpoint] = (response.headers["ETag"], body)
+                return body
         elif method == "POST":
             response = requests.post(f"{BACKEND_URL}{endpoint}", json=data, headers=headers)
         elif method == "PUT":